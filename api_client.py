@@ -1,10 +1,87 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import LRUCache
+
+API_CONCURRENCY = int(os.environ.get("MYBANK_API_CONCURRENCY", "4"))
+API_RETRIES = int(os.environ.get("MYBANK_API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.environ.get("MYBANK_API_RETRY_BACKOFF", "0.5"))
+API_CACHE_SIZE = int(os.environ.get("MYBANK_API_CACHE_SIZE", "256"))
+
+
+class BatchError(Exception):
+    # Raised by add_transactions when a chunk fails validation. Chunks before
+    # it are already stored (``inserted`` items); nothing from it or after is.
+    def __init__(self, inserted, results):
+        super().__init__(f"batch rejected after {inserted} inserted transactions")
+        self.inserted = inserted
+        self.results = results
 
 
 class APIClient:
-    def __init__(self, base_url):
+    def __init__(self, base_url, concurrency=API_CONCURRENCY, retries=API_RETRIES, backoff=API_RETRY_BACKOFF):
         self.base_url = base_url.rstrip("/")
+        self.concurrency = max(concurrency, 1)
         self.session = requests.Session()
+        # Idempotent requests (GET and friends, not POST) are retried with
+        # exponential backoff on connection errors and 5xx responses, and
+        # after the server's Retry-After on 429. The adapter keeps one
+        # keep-alive connection per concurrent worker.
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = LRUCache(API_CACHE_SIZE)
+
+    def _get(self, path, params=None, timeout=15):
+        # Sends If-None-Match for responses cached earlier and answers a 304
+        # from the cache. Bodies are kept as bytes so callers get fresh objects.
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self._cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        resp = self.session.get(
+            f"{self.base_url}{path}", params=params, headers=headers, timeout=timeout
+        )
+        if resp.status_code == 304 and cached:
+            return json.loads(cached[1]), cached[2]
+        resp.raise_for_status()
+        if resp.headers.get("ETag"):
+            self._cache.set(key, (resp.headers["ETag"], resp.content, resp.headers))
+        return resp.json(), resp.headers
+
+    def create_token(self, email, password, name="api"):
+        # Exchanges the password for a bearer token that authenticates every
+        # later request; returns the server's {"id", "token", ...} or None.
+        resp = self.session.post(
+            f"{self.base_url}/api/tokens",
+            json={"email": email, "password": password, "name": name},
+            timeout=15,
+        )
+        if resp.status_code == 401:
+            return None
+        resp.raise_for_status()
+        data = resp.json()
+        self.set_token(data["token"])
+        return data
+
+    def set_token(self, token):
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def revoke_token(self, token_id):
+        resp = self.session.delete(f"{self.base_url}/api/tokens/{token_id}", timeout=15)
+        return resp.status_code == 200
 
     def login(self, email, password):
         resp = self.session.post(
@@ -29,24 +106,87 @@ class APIClient:
         return True
 
     def list_transactions(self, limit=200, offset=0):
-        resp = self.session.get(
-            f"{self.base_url}/api/transactions",
-            params={"limit": limit, "offset": offset},
+        return self._get("/api/transactions", {"limit": limit, "offset": offset})[0]
+
+    def list_transactions_page(self, limit=200, cursor=None, until=None):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if until:
+            params["until"] = until
+        rows, headers = self._get("/api/transactions", params)
+        return rows, headers.get("X-Next-Cursor")
+
+    def list_transactions_with_total(self, limit=200, offset=0):
+        rows, headers = self._get("/api/transactions", {"limit": limit, "offset": offset})
+        return rows, int(headers.get("X-Total-Count", "0"))
+
+    def list_all_transactions(self, page_size=200, concurrency=None):
+        concurrency = concurrency or self.concurrency
+        if concurrency > 1:
+            return self._list_all_transactions_parallel(page_size, concurrency)
+        return self._walk_range(page_size)
+
+    def iter_transactions(self):
+        # Reads the NDJSON export line by line, oldest transaction first.
+        with self.session.get(
+            f"{self.base_url}/api/transactions/export",
+            params={"format": "ndjson"},
+            stream=True,
             timeout=15,
-        )
-        resp.raise_for_status()
-        return resp.json()
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(chunk_size=64 * 1024):
+                if line:
+                    yield json.loads(line)
+
+    def _list_all_transactions_parallel(self, page_size, concurrency):
+        # Splits the list at evenly spaced rows into disjoint keyset ranges and
+        # walks each one by cursor on its own thread. Offsets only locate the
+        # split rows, and sorting them keeps the ranges apart even if writes
+        # moved rows between probes; the result stays in (date DESC, id DESC).
+        _, total = self.list_transactions_with_total(limit=1)
+        ranges = min(concurrency, -(-total // page_size))
+        if ranges < 2:
+            return self._walk_range(page_size)
 
-    def list_all_transactions(self, page_size=200):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            offsets = [total * index // ranges for index in range(1, ranges)]
+            splits = dict(split for split in executor.map(self._split_row, offsets) if split)
+            bounds = [None] + [splits[key] for key in sorted(splits, reverse=True)] + [None]
+            pages = executor.map(
+                self._walk_range, [page_size] * (len(bounds) - 1), bounds[:-1], bounds[1:]
+            )
+            return [row for page in pages for row in page]
+
+    def _walk_range(self, page_size, cursor=None, until=None):
         all_rows = []
-        offset = 0
         while True:
-            rows = self.list_transactions(limit=page_size, offset=offset)
+            rows, cursor = self.list_transactions_page(limit=page_size, cursor=cursor, until=until)
             all_rows.extend(rows)
-            if len(rows) < page_size:
-                break
-            offset += page_size
-        return all_rows
+            if not cursor:
+                return all_rows
+
+    def _split_row(self, offset):
+        # The row at offset as ((date, id), cursor token). The token ends one
+        # range at that row (until) and starts the next one after it (cursor).
+        rows, headers = self._get("/api/transactions", {"limit": 1, "offset": offset})
+        if rows and headers.get("X-Next-Cursor"):
+            return (rows[0]["date"], rows[0]["id"]), headers["X-Next-Cursor"]
+        return None
+
+    def get_stats(self, views=None):
+        params = {"views": ",".join(views)} if views else None
+        return self._get("/api/stats", params)[0]
+
+    def get_changes(self, since=0, limit=1000):
+        resp = self.session.get(
+            f"{self.base_url}/api/transactions/changes",
+            params={"since": since, "limit": limit},
+            timeout=30,
+        )
+        resp.raise_for_status()
+        return resp.json()
 
     def add_transaction(self, payload):
         resp = self.session.post(
@@ -57,6 +197,43 @@ class APIClient:
         resp.raise_for_status()
         return resp.json()
 
+    def add_transactions(self, payloads, chunk_size=500):
+        # Each chunk is one request and is inserted atomically by the server;
+        # keep chunk_size at or below the server's MYBANK_API_BATCH_LIMIT.
+        results = []
+        for start in range(0, len(payloads), chunk_size):
+            resp = self.session.post(
+                f"{self.base_url}/api/transactions",
+                json=payloads[start : start + chunk_size],
+                timeout=60,
+            )
+            if resp.status_code == 400 and "results" in resp.json():
+                failed = resp.json()["results"]
+                for result in failed:
+                    result["index"] += start
+                raise BatchError(start, failed)
+            resp.raise_for_status()
+            for result in resp.json()["results"]:
+                result["index"] += start
+                results.append(result)
+        return results
+
+    def import_file(self, path, file_format=None):
+        params = {"format": file_format} if file_format else {}
+        with open(path, "rb") as file:
+            resp = self.session.post(
+                f"{self.base_url}/api/transactions/import",
+                params=params,
+                data=file,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=600,
+            )
+        if resp.status_code == 400 and resp.json().get("error") == "invalid_file":
+            # The whole file was refused; nothing was imported.
+            return resp.json()
+        resp.raise_for_status()
+        return resp.json()
+
     def set_cookies(self, cookies):
         self.session.cookies.update(cookies or {})
 
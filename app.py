@@ -1,27 +1,67 @@
+import csv
 import datetime
+import hashlib
+import io
+import json
+import math
 import os
+import shutil
+import sqlite3
+import tempfile
 from functools import wraps
 
-from flask import Flask, flash, jsonify, redirect, render_template, request, session, url_for
+from flask import (
+    Flask,
+    Response,
+    flash,
+    g,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 
+import scheduler
+from importer import ImportFileError, check_lines, detect_format, import_lines
+from money import format_cents, to_dollars
+from passwords import HashingBusy, start_pool
+from ratelimit import RateLimiter
+from recurring import FREQUENCIES
+from stats_engine import VIEWS, load_stats, stats_views
+from validation import normalize_transaction, parse_amount, parse_date, valid_category
 from storage import (
     INCOME_CATEGORIES,
     SPENDING_CATEGORIES,
     authenticate_user,
-    count_transactions,
+    close_db,
+    create_api_token,
     create_user,
+    decode_cursor,
+    delete_api_token,
     delete_recurring_expense,
     delete_transaction,
     fetch_recurring_expense,
     fetch_transaction,
+    get_data_version,
+    get_user_by_api_token,
     get_user_by_email,
-    get_db,
+    get_read_db,
     init_db,
     insert_recurring_expense,
     insert_transaction,
+    insert_transactions,
+    iter_transactions,
+    list_api_tokens,
     list_recurring_expenses,
+    month_bounds,
+    next_cursor,
     process_due_recurring_expenses,
-    query_transactions,
+    search_transactions,
+    transaction_changes,
     set_recurring_expense_active,
     update_recurring_expense,
     update_transaction,
@@ -29,7 +69,27 @@ from storage import (
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("MYBANK_SECRET", "dev-secret")
+API_BATCH_LIMIT = int(os.environ.get("MYBANK_API_BATCH_LIMIT", "500"))
+# Raw import bodies larger than this many bytes are spooled to a temp file.
+IMPORT_SPOOL_SIZE = int(os.environ.get("MYBANK_IMPORT_SPOOL_SIZE", str(1024 * 1024)))
+# Part of every ETag; change it to invalidate cached responses after a deploy
+# that changes how pages render.
+ETAG_SALT = os.environ.get("MYBANK_ETAG_SALT", "1")
+# Token bucket per route group as "requests/seconds", e.g. "10/60"; "off"
+# disables a group. Keys are the client IP and, for auth, the email tried.
+RATE_LIMITS = {
+    "auth": os.environ.get("MYBANK_RATE_LIMIT_AUTH", "10/60"),
+    "api": os.environ.get("MYBANK_RATE_LIMIT_API", "1200/60"),
+}
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("MYBANK_RATE_LIMIT_MAX_KEYS", "10000"))
+# Header carrying the real client address when behind a proxy, e.g.
+# Fly-Client-IP; empty uses the connection's address.
+CLIENT_IP_HEADER = os.environ.get("MYBANK_CLIENT_IP_HEADER", "")
+_rate_limiters = {
+    group: RateLimiter.from_spec(spec, RATE_LIMIT_MAX_KEYS) for group, spec in RATE_LIMITS.items()
+}
 _db_initialized = False
+app.teardown_appcontext(close_db)
 
 
 @app.before_request
@@ -38,58 +98,17 @@ def setup_db_once():
     if not _db_initialized:
         init_db()
         _db_initialized = True
-    if session.get("user_id"):
-        process_due_recurring_expenses(session["user_id"])
-
-
-def valid_category(tx_type, category):
-    if tx_type == "income":
-        return category in INCOME_CATEGORIES
-    if tx_type == "spending":
-        return category in SPENDING_CATEGORIES
-    return False
-
-
-def parse_amount(raw):
-    try:
-        return float(raw)
-    except (TypeError, ValueError):
-        return None
-
-
-def normalize_transaction(form):
-    amount = parse_amount(form.get("amount"))
-    tx_type = (form.get("type") or "").lower()
-    category = (form.get("category") or "").lower()
-    description = form.get("description") or ""
-    date = form.get("date") or datetime.date.today().isoformat()
-
-    if amount is None or amount <= 0:
-        return None, "Amount must be a positive number."
-
-    if tx_type not in ("income", "spending"):
-        return None, "Type must be income or spending."
-
-    if not valid_category(tx_type, category):
-        return None, "Please pick a valid category."
-
-    if not description.strip():
-        description = "(no description)"
-
-    return {
-        "amount": amount,
-        "type": tx_type,
-        "category": category,
-        "description": description,
-        "date": date,
-    }, None
+        start_pool()
+        scheduler.start_background()
+    scheduler.run_if_stale()
 
 
 def normalize_recurring_expense(form):
-    amount = parse_amount(form.get("amount"))
+    amount_cents = parse_amount(form.get("amount"))
     category = (form.get("category") or "").lower()
     description = form.get("description") or ""
     start_date = form.get("start_date") or datetime.date.today().isoformat()
+    frequency = (form.get("frequency") or "monthly").lower()
     active = 1 if form.get("active", "1") == "1" else 0
 
     try:
@@ -97,7 +116,7 @@ def normalize_recurring_expense(form):
     except ValueError:
         billing_day = None
 
-    if amount is None or amount <= 0:
+    if amount_cents is None or amount_cents <= 0:
         return None, "Amount must be a positive number."
 
     if not valid_category("spending", category):
@@ -106,52 +125,168 @@ def normalize_recurring_expense(form):
     if billing_day is None or billing_day < 1 or billing_day > 31:
         return None, "Billing day must be between 1 and 31."
 
-    try:
-        datetime.date.fromisoformat(start_date)
-    except ValueError:
+    if frequency not in FREQUENCIES:
+        return None, "Please pick a valid frequency."
+
+    start_date = parse_date(start_date)
+    if start_date is None:
         return None, "Start date must be a valid date."
 
     if not description.strip():
         description = "(no description)"
 
     return {
-        "amount": amount,
+        "amount_cents": amount_cents,
         "category": category,
         "description": description,
         "billing_day": billing_day,
+        "frequency": frequency,
         "start_date": start_date,
         "active": active,
     }, None
 
 
 @app.template_filter("currency")
-def currency_filter(value):
+def currency_filter(cents):
     try:
-        return f"{float(value):,.2f}"
+        return format_cents(cents, grouping=True)
     except (TypeError, ValueError):
         return "0.00"
 
 
+@app.template_filter("cents")
+def cents_filter(cents):
+    # Plain "1234.56" for form values and data attributes.
+    return format_cents(cents)
+
+
+def transaction_json(row):
+    # JSON keeps amounts in dollars; cents never leave the server.
+    data = {key: row[key] for key in row.keys() if key != "amount_cents"}
+    data["amount"] = to_dollars(row["amount_cents"])
+    return data
+
+
 def login_required(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
         if not session.get("user_id"):
             return redirect(url_for("login"))
+        g.user_id = session["user_id"]
         return view(*args, **kwargs)
 
     return wrapped
 
 
 def api_login_required(view):
+    # Accepts the browser session or an "Authorization: Bearer <token>"
+    # header; either way the account is in g.user_id.
     @wraps(view)
     def wrapped(*args, **kwargs):
-        if not session.get("user_id"):
+        user_id = session.get("user_id")
+        auth = request.authorization
+        if auth and auth.type == "bearer":
+            user = get_user_by_api_token(auth.token or "")
+            if not user:
+                return jsonify({"error": "invalid_token"}), 401
+            user_id = user["id"]
+        if not user_id:
             return jsonify({"error": "auth_required"}), 401
+        g.user_id = user_id
         return view(*args, **kwargs)
 
     return wrapped
 
 
+def retry_later(status, error, message, seconds):
+    if request.path.startswith("/api/"):
+        response = jsonify({"error": error})
+    else:
+        response = make_response(message)
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(math.ceil(seconds), 1))
+    return response
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(error):
+    # Every password hashing slot is taken: turn the client away instead of
+    # queueing more CPU work behind the logins already waiting.
+    return retry_later(503, "busy", "Too many sign-ins at once, please try again in a moment.", 1)
+
+
+def client_ip():
+    if CLIENT_IP_HEADER and request.headers.get(CLIENT_IP_HEADER):
+        return request.headers[CLIENT_IP_HEADER].split(",")[0].strip()
+    return request.remote_addr or ""
+
+
+def rate_limited(group, methods=None, by_email=False):
+    # Goes right under @app.route so throttled requests are answered before
+    # authentication, password hashing or any database work.
+    limiter = _rate_limiters.get(group)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if limiter is None or (methods and request.method not in methods):
+                return view(*args, **kwargs)
+            keys = [("ip", client_ip())]
+            if by_email:
+                payload = request.get_json(silent=True)
+                if not isinstance(payload, dict):
+                    payload = request.form
+                email = str(payload.get("email") or "").strip().lower()
+                if email:
+                    keys.append(("email", email))
+            for key in keys:
+                wait = limiter.acquire(key)
+                if wait:
+                    return retry_later(429, "rate_limited", "Too many requests, please slow down.", wait)
+            return view(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def conditional_get(per_day=False):
+    # Weak ETag from the user's data_version and the request's path and query,
+    # checked against If-None-Match before the view runs. per_day also keys
+    # on today's date for views whose output depends on it.
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Pending flash messages are shown by the next render, so skip the
+            # shortcut rather than answer 304 and leave them queued.
+            if request.method != "GET" or session.get("_flashes"):
+                return view(*args, **kwargs)
+            user_id = g.user_id
+            key = [
+                ETAG_SALT,
+                user_id,
+                get_data_version(user_id),
+                request.path,
+                sorted(request.args.items(multi=True)),
+            ]
+            if per_day:
+                key.append(datetime.date.today().isoformat())
+            etag = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapped
+
+    return decorator
+
+
 def build_pagination(current_page, total_pages, window=2):
     if total_pages <= 1:
         return []
@@ -195,7 +330,7 @@ def add():
     user_id = session["user_id"]
     insert_transaction(
         user_id,
-        payload["amount"],
+        payload["amount_cents"],
         payload["type"],
         payload["category"],
         payload["description"],
@@ -206,160 +341,60 @@ def add():
     return redirect(url_for("index"))
 
 
-def totals_for_period(conn, user_id, start_date):
-    rows = conn.execute(
-        """
-        SELECT type, COALESCE(SUM(amount), 0) AS total
-        FROM transactions
-        WHERE date >= ? AND user_id = ?
-        GROUP BY type
-        """,
-        (start_date, user_id),
-    ).fetchall()
-
-    totals = {"income": 0, "spending": 0}
-    for row in rows:
-        totals[row["type"]] = round(row["total"], 2)
-    return totals
-
-
 @app.route("/stats")
 @login_required
+@conditional_get(per_day=True)
 def stats():
     user_id = session["user_id"]
     month_param = (request.args.get("month") or "").strip()
     year_param = (request.args.get("year") or "").strip()
-    with get_db() as conn:
-        all_time = totals_for_period(conn, user_id, "0000-01-01")
-
-        periods = []
-        for days in (30, 90, 120, 360):
-            start_date = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
-            totals = totals_for_period(conn, user_id, start_date)
-            periods.append({"days": days, "totals": totals})
-
-        recent = conn.execute(
-            """
-            SELECT amount, type, category, description, date
-            FROM transactions
-            WHERE user_id = ?
-            ORDER BY date DESC, id DESC
-            LIMIT 5
-            """
-        , (user_id,)).fetchall()
-
-        monthly_rows = conn.execute(
-            """
-            SELECT
-                strftime('%Y-%m', date) AS month,
-                COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) AS income_total,
-                COALESCE(SUM(CASE WHEN type = 'spending' THEN amount ELSE 0 END), 0) AS spending_total
-            FROM transactions
-            WHERE user_id = ?
-            GROUP BY month
-            ORDER BY month DESC
-            """
-        , (user_id,)).fetchall()
-
-        monthly_summary_all = []
-        available_years = []
-        known_years = set()
-        for row in monthly_rows:
-            month = row["month"]
-            year = month.split("-")[0]
-            income_total = round(row["income_total"], 2)
-            spending_total = round(row["spending_total"], 2)
-            if year not in known_years:
-                known_years.add(year)
-                available_years.append(year)
-            monthly_summary_all.append(
-                {
-                    "month": month,
-                    "year": year,
-                    "income": income_total,
-                    "spending": spending_total,
-                    "net": round(income_total - spending_total, 2),
-                }
-            )
-
-        if year_param in available_years:
-            selected_year = year_param
-        elif month_param[:4] in available_years:
-            selected_year = month_param[:4]
-        elif available_years:
-            selected_year = available_years[0]
-        else:
-            selected_year = datetime.date.today().strftime("%Y")
-
-        monthly_summary = [
-            {
-                "month": item["month"],
-                "income": item["income"],
-                "spending": item["spending"],
-                "net": item["net"],
-            }
-            for item in monthly_summary_all
-            if item["year"] == selected_year
-        ]
-        available_months = [item["month"] for item in monthly_summary]
-
-        if month_param in available_months:
-            selected_month = month_param
-        else:
-            selected_month = available_months[0] if available_months else datetime.date.today().strftime("%Y-%m")
-
-        yearly_totals_rows = conn.execute(
-            """
-            SELECT type, COALESCE(SUM(amount), 0) AS total
-            FROM transactions
-            WHERE strftime('%Y', date) = ? AND user_id = ?
-            GROUP BY type
-            """,
-            (selected_year, user_id),
-        ).fetchall()
-        selected_year_totals = {"income": 0, "spending": 0, "net": 0}
-        for row in yearly_totals_rows:
-            selected_year_totals[row["type"]] = round(row["total"], 2)
-        selected_year_totals["net"] = round(
-            selected_year_totals["income"] - selected_year_totals["spending"], 2
-        )
-
-        monthly_totals = conn.execute(
-            """
-            SELECT type, COALESCE(SUM(amount), 0) AS total
-            FROM transactions
-            WHERE strftime('%Y-%m', date) = ? AND user_id = ?
-            GROUP BY type
-            """,
-            (selected_month, user_id),
-        ).fetchall()
-
-        monthly_by_type = {"income": 0, "spending": 0}
-        for row in monthly_totals:
-            monthly_by_type[row["type"]] = round(row["total"], 2)
-
-        category_rows = conn.execute(
-            """
-            SELECT category, type, COALESCE(SUM(amount), 0) AS total
-            FROM transactions
-            WHERE strftime('%Y-%m', date) = ? AND user_id = ?
-            GROUP BY type, category
-            ORDER BY type ASC, total DESC
-            """,
-            (selected_month, user_id),
-        ).fetchall()
-
-        category_breakdown = {"income": [], "spending": []}
-        for row in category_rows:
-            category_breakdown[row["type"]].append(
-                {"category": row["category"], "total": round(row["total"], 2)}
-            )
+    data = load_stats(user_id)
+
+    available_years = []
+    for item in data["months"]:
+        if item["year"] not in available_years:
+            available_years.append(item["year"])
+
+    if year_param in available_years:
+        selected_year = year_param
+    elif month_param[:4] in available_years:
+        selected_year = month_param[:4]
+    elif available_years:
+        selected_year = available_years[0]
+    else:
+        selected_year = datetime.date.today().strftime("%Y")
+
+    monthly_summary = [
+        {
+            "month": item["month"],
+            "income": item["income"],
+            "spending": item["spending"],
+            "net": item["net"],
+        }
+        for item in data["months"]
+        if item["year"] == selected_year
+    ]
+    available_months = [item["month"] for item in monthly_summary]
+
+    if month_param in available_months:
+        selected_month = month_param
+    else:
+        selected_month = available_months[0] if available_months else datetime.date.today().strftime("%Y-%m")
+
+    year_totals = data["year_totals"].get(selected_year, {"income": 0, "spending": 0})
+    selected_year_totals = {
+        "income": year_totals["income"],
+        "spending": year_totals["spending"],
+        "net": year_totals["income"] - year_totals["spending"],
+    }
+    monthly_by_type = data["month_totals"].get(selected_month, {"income": 0, "spending": 0})
+    category_breakdown = data["categories"].get(selected_month, {"income": [], "spending": []})
 
     return render_template(
         "stats.html",
-        all_time=all_time,
-        periods=periods,
-        recent=recent,
+        all_time=data["all_time"],
+        periods=data["periods"],
+        recent=data["recent"],
         available_years=available_years,
         selected_year=selected_year,
         selected_year_totals=selected_year_totals,
@@ -378,6 +413,7 @@ def transactions():
     query = (request.args.get("q") or "").strip()
     category = (request.args.get("category") or "").strip().lower()
     tx_type = (request.args.get("type") or "").strip().lower()
+    sort = "relevance" if query and request.args.get("sort") == "relevance" else ""
     page = request.args.get("page", "1")
     try:
         page = max(int(page), 1)
@@ -385,25 +421,35 @@ def transactions():
         page = 1
 
     page_size = 20
-    total = count_transactions(
+    # "Next" links carry a keyset cursor so deep pages don't walk an OFFSET;
+    # numbered links still jump straight to a page by offset.
+    cursor = decode_cursor(request.args.get("cursor") or "")
+    filters = (
         user_id,
         query if query else None,
         category if category else None,
         tx_type if tx_type else None,
     )
-    total_pages = max((total + page_size - 1) // page_size, 1)
-    if page > total_pages:
-        page = total_pages
-
-    rows = query_transactions(
-        user_id,
-        query if query else None,
-        category if category else None,
-        tx_type if tx_type else None,
+    rows, total = search_transactions(
+        *filters,
         limit=page_size,
         offset=(page - 1) * page_size,
+        cursor=cursor,
+        rank=bool(sort),
     )
+    total_pages = max((total + page_size - 1) // page_size, 1)
+    if page > total_pages:
+        page = total_pages
+        rows, total = search_transactions(
+            *filters,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            rank=bool(sort),
+        )
     pages = build_pagination(page, total_pages)
+    next_page_cursor = None
+    if page < total_pages and not sort:
+        next_page_cursor = next_cursor(rows, page_size)
 
     return render_template(
         "transactions.html",
@@ -411,10 +457,12 @@ def transactions():
         query=query,
         selected_category=category,
         selected_type=tx_type,
+        selected_sort=sort,
         page=page,
         total_pages=total_pages,
         total=total,
         pages=pages,
+        next_page_cursor=next_page_cursor,
         income_categories=INCOME_CATEGORIES,
         spending_categories=SPENDING_CATEGORIES,
     )
@@ -438,7 +486,7 @@ def edit_transaction(tx_id):
         update_transaction(
             tx_id,
             user_id,
-            payload["amount"],
+            payload["amount_cents"],
             payload["type"],
             payload["category"],
             payload["description"],
@@ -473,6 +521,7 @@ def recurring_expenses():
         "recurring.html",
         rows=rows,
         spending_categories=SPENDING_CATEGORIES,
+        frequencies=FREQUENCIES,
     )
 
 
@@ -486,13 +535,15 @@ def add_recurring_expense():
 
     insert_recurring_expense(
         session["user_id"],
-        payload["amount"],
+        payload["amount_cents"],
         payload["category"],
         payload["description"],
         payload["billing_day"],
         payload["start_date"],
         payload["active"],
+        payload["frequency"],
     )
+    process_due_recurring_expenses(session["user_id"])
     flash("Recurring expense added.")
     return redirect(url_for("recurring_expenses"))
 
@@ -513,13 +564,15 @@ def edit_recurring_expense(recurring_id):
     update_recurring_expense(
         recurring_id,
         user_id,
-        payload["amount"],
+        payload["amount_cents"],
         payload["category"],
         payload["description"],
         payload["billing_day"],
         payload["start_date"],
         payload["active"],
+        payload["frequency"],
     )
+    process_due_recurring_expenses(session["user_id"])
     flash("Recurring expense updated.")
     return redirect(url_for("recurring_expenses"))
 
@@ -536,6 +589,7 @@ def cancel_recurring_expense(recurring_id):
 @login_required
 def resume_recurring_expense(recurring_id):
     set_recurring_expense_active(recurring_id, session["user_id"], 1)
+    process_due_recurring_expenses(session["user_id"])
     flash("Recurring expense resumed.")
     return redirect(url_for("recurring_expenses"))
 
@@ -550,6 +604,7 @@ def remove_recurring_expense(recurring_id):
 
 @app.route("/transactions/filter")
 @login_required
+@conditional_get()
 def transactions_filter():
     user_id = session["user_id"]
     month = (request.args.get("month") or "").strip()
@@ -559,8 +614,11 @@ def transactions_filter():
     clauses = ["user_id = ?"]
     params = [user_id]
     if month:
-        clauses.append("strftime('%Y-%m', date) = ?")
-        params.append(month)
+        bounds = month_bounds(month)
+        if bounds is None:
+            return jsonify([])
+        clauses.append("date >= ? AND date < ?")
+        params.extend(bounds)
     if tx_type:
         clauses.append("type = ?")
         params.append(tx_type)
@@ -570,10 +628,10 @@ def transactions_filter():
 
     where_clause = f"WHERE {' AND '.join(clauses)}"
 
-    with get_db() as conn:
+    with get_read_db() as conn:
         rows = conn.execute(
             f"""
-            SELECT id, amount, type, category, description, date
+            SELECT id, amount_cents, type, category, description, date
             FROM transactions
             {where_clause}
             ORDER BY date DESC, id DESC
@@ -581,22 +639,13 @@ def transactions_filter():
             params,
         ).fetchall()
 
-    payload = [
-        {
-            "id": row["id"],
-            "amount": row["amount"],
-            "type": row["type"],
-            "category": row["category"],
-            "description": row["description"],
-            "date": row["date"],
-        }
-        for row in rows
-    ]
+    payload = [transaction_json(row) for row in rows]
 
     return jsonify(payload)
 
 
 @app.route("/api/login", methods=["POST"])
+@rate_limited("auth", by_email=True)
 def api_login():
     payload = request.get_json(silent=True) or request.form
     email = (payload.get("email") or "").strip().lower()
@@ -609,24 +658,68 @@ def api_login():
     return jsonify({"ok": True, "user": {"id": user["id"], "email": user["email"]}})
 
 
+@app.route("/api/tokens", methods=["POST"])
+@rate_limited("auth", by_email=True)
+def api_create_token():
+    # Trades email and password for a long-lived bearer token, so API clients
+    # pay for one password check instead of one per login.
+    payload = request.get_json(silent=True) or request.form
+    email = (payload.get("email") or "").strip().lower()
+    password = payload.get("password") or ""
+    user = authenticate_user(email, password)
+    if not user:
+        return jsonify({"error": "invalid_credentials"}), 401
+    name = (payload.get("name") or "api").strip()[:100]
+    token_id, token = create_api_token(user["id"], name)
+    return jsonify(
+        {
+            "ok": True,
+            "id": token_id,
+            "token": token,
+            "user": {"id": user["id"], "email": user["email"]},
+        }
+    ), 201
+
+
+@app.route("/api/tokens", methods=["GET"])
+@rate_limited("api")
+@api_login_required
+def api_list_tokens():
+    return jsonify([dict(row) for row in list_api_tokens(g.user_id)])
+
+
+@app.route("/api/tokens/<int:token_id>", methods=["DELETE"])
+@rate_limited("api")
+@api_login_required
+def api_delete_token(token_id):
+    if not delete_api_token(token_id, g.user_id):
+        return jsonify({"error": "not_found"}), 404
+    return jsonify({"ok": True})
+
+
 @app.route("/api/transactions", methods=["GET", "POST"])
+@rate_limited("api")
 @api_login_required
+@conditional_get()
 def api_transactions():
-    user_id = session["user_id"]
+    user_id = g.user_id
     if request.method == "POST":
-        payload = request.get_json(silent=True) or request.form
+        payload = request.get_json(silent=True)
+        if isinstance(payload, list):
+            return api_create_transactions(user_id, payload)
+        payload = payload or request.form
         tx, error = normalize_transaction(payload)
         if error:
             return jsonify({"error": error}), 400
         insert_transaction(
             user_id,
-            tx["amount"],
+            tx["amount_cents"],
             tx["type"],
             tx["category"],
             tx["description"],
             tx["date"],
         )
-        return jsonify({"ok": True, "transaction": tx}), 201
+        return jsonify({"ok": True, "transaction": transaction_json(tx)}), 201
 
     try:
         limit = max(int(request.args.get("limit", "200")), 1)
@@ -636,23 +729,174 @@ def api_transactions():
         offset = max(int(request.args.get("offset", "0")), 0)
     except ValueError:
         offset = 0
+    # cursor starts the page after that row; until ends the walk at that row,
+    # so a client can split the list into disjoint keyset ranges.
+    bounds = {}
+    for name in ("cursor", "until"):
+        if request.args.get(name):
+            bounds[name] = decode_cursor(request.args[name])
+            if bounds[name] is None:
+                return jsonify({"error": f"invalid_{name}"}), 400
+
+    rows, total = search_transactions(user_id, limit=limit, offset=offset, **bounds)
+    payload = [transaction_json(row) for row in rows]
+    response = jsonify(payload)
+    response.headers["X-Total-Count"] = str(total)
+    cursor_token = next_cursor(rows, limit)
+    if cursor_token:
+        response.headers["X-Next-Cursor"] = cursor_token
+    return response
+
+
+def api_create_transactions(user_id, items):
+    # All or nothing: every item is validated first and the batch is only
+    # written, with a single commit, when all of them pass.
+    if not items:
+        return jsonify({"error": "empty_batch"}), 400
+    if len(items) > API_BATCH_LIMIT:
+        return jsonify({"error": "batch_too_large", "limit": API_BATCH_LIMIT}), 413
+
+    results = []
+    transactions = []
+    for index, item in enumerate(items):
+        tx, error = normalize_transaction(item if isinstance(item, dict) else {})
+        if error:
+            results.append({"index": index, "ok": False, "error": error})
+        else:
+            results.append({"index": index, "ok": True, "transaction": transaction_json(tx)})
+            transactions.append(tx)
+
+    if len(transactions) < len(items):
+        return jsonify({"ok": False, "inserted": 0, "results": results}), 400
+    insert_transactions(user_id, transactions)
+    return jsonify({"ok": True, "inserted": len(transactions), "results": results}), 201
+
+
+@app.route("/api/stats")
+@rate_limited("api")
+@api_login_required
+@conditional_get(per_day=True)
+def api_stats():
+    # ?views=totals,windows,... picks a subset; all views by default.
+    views = [view for view in (request.args.get("views") or "").split(",") if view]
+    unknown = [view for view in views if view not in VIEWS]
+    if unknown:
+        return jsonify({"error": "unknown_view", "views": unknown}), 400
+    return jsonify(stats_views(g.user_id, views or VIEWS))
+
+
+@app.route("/api/transactions/changes")
+@rate_limited("api")
+@api_login_required
+def api_transaction_changes():
+    # Delta sync: clients pass the watermark from their previous call and get
+    # the rows changed and the ids deleted since then. A watermark the server
+    # no longer recognizes yields a full resync flagged with "reset".
+    user_id = g.user_id
+    try:
+        since = max(int(request.args.get("since", "0")), 0)
+    except ValueError:
+        return jsonify({"error": "invalid_since"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", "1000")), 1), 5000)
+    except ValueError:
+        limit = 1000
 
-    rows = query_transactions(user_id, limit=limit, offset=offset)
-    payload = [
+    result = transaction_changes(user_id, since, limit)
+    return jsonify(
         {
-            "id": row["id"],
-            "amount": row["amount"],
-            "type": row["type"],
-            "category": row["category"],
-            "description": row["description"],
-            "date": row["date"],
+            "user_id": user_id,
+            "watermark": result["watermark"],
+            "has_more": result["has_more"],
+            "reset": result["reset"],
+            "changes": [transaction_json(row) for row in result["changes"]],
+            "deleted": result["deleted"],
         }
-        for row in rows
-    ]
-    return jsonify(payload)
+    )
+
+
+EXPORT_COLUMNS = ["id", "amount", "type", "category", "description", "date"]
+EXPORT_FLUSH_ROWS = 500
+
+
+def _ndjson_chunks(rows):
+    # One response chunk per EXPORT_FLUSH_ROWS rows rather than per row.
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record["amount"] = to_dollars(record["amount"])
+        lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if len(lines) >= EXPORT_FLUSH_ROWS:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        values = list(row)
+        values[1] = format_cents(values[1])
+        writer.writerow(values)
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.route("/api/transactions/export")
+@rate_limited("api")
+@api_login_required
+def api_export_transactions():
+    # Streams the user's transactions oldest first; rows are read from the
+    # database in batches as the client consumes the response.
+    file_format = request.args.get("format", "ndjson").lower()
+    rows = iter_transactions(g.user_id)
+    if file_format == "ndjson":
+        return Response(stream_with_context(_ndjson_chunks(rows)), mimetype="application/x-ndjson")
+    if file_format == "csv":
+        response = Response(stream_with_context(_csv_chunks(rows)), mimetype="text/csv")
+        response.headers["Content-Disposition"] = "attachment; filename=transactions.csv"
+        return response
+    return jsonify({"error": "unsupported_format"}), 400
+
+
+@app.route("/api/transactions/import", methods=["POST"])
+@rate_limited("api")
+@api_login_required
+def api_import_transactions():
+    # Accepts a multipart "file" upload or the raw file as the request body.
+    # Both are spooled to disk past a size and read line by line, once to
+    # check the whole file and once to import it, so large exports never sit
+    # in memory and an unreadable file is refused before anything is stored.
+    upload = request.files.get("file")
+    if upload:
+        stream, filename, content_type = upload.stream, upload.filename, upload.mimetype
+    else:
+        stream = tempfile.SpooledTemporaryFile(IMPORT_SPOOL_SIZE)
+        shutil.copyfileobj(request.stream, stream)
+        stream.seek(0)
+        filename, content_type = None, request.mimetype
+    file_format = detect_format(filename, content_type, request.args.get("format"))
+    if file_format is None:
+        return jsonify({"error": "unsupported_format"}), 400
+
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        check_lines(lines, file_format)
+    except ImportFileError as exc:
+        return jsonify({"error": "invalid_file", "row": exc.row, "message": str(exc), "inserted": 0}), 400
+    lines.seek(0)
+    result = import_lines(g.user_id, lines, file_format)
+    return jsonify({"ok": True, **result})
 
 
 @app.route("/login", methods=["GET", "POST"])
+@rate_limited("auth", methods=("POST",), by_email=True)
 def login():
     if request.method == "POST":
         email = (request.form.get("email") or "").strip().lower()
@@ -668,6 +912,7 @@ def login():
 
 
 @app.route("/signup", methods=["GET", "POST"])
+@rate_limited("auth", methods=("POST",), by_email=True)
 def signup():
     if request.method == "POST":
         email = (request.form.get("email") or "").strip().lower()
@@ -684,7 +929,7 @@ def signup():
             return redirect(url_for("login"))
         try:
             user_id = create_user(email, password)
-        except Exception:
+        except sqlite3.IntegrityError:
             flash("Email already in use.")
             return redirect(url_for("signup"))
 
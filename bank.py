@@ -1,6 +1,8 @@
 import datetime
 
+from money import format_cents
 from storage import INCOME_CATEGORIES, SPENDING_CATEGORIES, init_db, insert_transaction
+from validation import parse_amount
 
 
 class Money:
@@ -36,17 +38,17 @@ class Money:
             init_db()
             insert_transaction(
                 self.user_id,
-                payload["amount"],
+                self.amount,
                 payload["type"],
                 payload["category"],
                 payload["description"],
                 payload["date"],
             )
-        print(f"{self.amount} added as {self.category} {self.option} in {self.date}")
+        print(f"{format_cents(self.amount)} added as {self.category} {self.option} in {self.date}")
     
     def to_payload(self):
         return {
-            "amount": self.amount,
+            "amount": format_cents(self.amount),
             "type": self.option,
             "date": self.date.isoformat(),
             "category": self.category,
@@ -56,11 +58,9 @@ class Money:
 
 
     def get_amount(self):
-        try:
-            amount = float(input("Enter Amount: "))
-        except ValueError:
+        amount = parse_amount(input("Enter Amount: "))
+        if amount is None:
             print("Has to be number")
-            return None
         return amount
     
     def get_description(self):
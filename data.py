@@ -1,11 +1,31 @@
-from datetime import datetime
+import contextlib
+import io
+import os
+from datetime import date, datetime, timedelta
 
-from storage import get_db, init_db
+import mirror
+from money import format_cents, to_cents
+from reports import compute_reports
+from storage import get_read_db, init_db, iter_transactions
+
+# "sql" aggregates local reports with GROUP BY queries; "python" walks every
+# row and is kept as the reference the SQL path is checked against.
+# "columnar" computes all reports in one pass over the raw rows (NumPy if it
+# is installed), reading the local mirror in API mode.
+REPORT_BACKEND = os.environ.get("MYBANK_REPORT_BACKEND", "sql")
+REPORTS = (
+    "get_all_spending_income",
+    "get_last_months_income_spending",
+    "get_income_spending_per_month",
+    "get_income_spending_per_category",
+)
 
 class RetrieveData:
-    def __init__(self, user_id, api_client=None):
+    def __init__(self, user_id, api_client=None, backend=REPORT_BACKEND):
         self.user_id = user_id
         self.api_client = api_client
+        self.backend = backend
+        self._reports = None
 
     def run(self):
         print("\nWhat do you wanna see?")
@@ -26,38 +46,104 @@ class RetrieveData:
         selected_method()
 
     def get_data(self):
+        # Both sources stream rows oldest first instead of building a list. In
+        # API mode they come from the local mirror after a delta sync.
         if self.api_client:
-            rows = self.api_client.list_all_transactions()
-            def sort_key(row):
-                return (row.get("date") or "", row.get("id") or 0)
-            rows.sort(key=sort_key)
-            return rows
+            conn = mirror.connect()
+            mirror.sync(self.api_client, conn)
+            return mirror.iter_transactions(conn)
         init_db()
-        with get_db() as conn:
-            rows = conn.execute(
-                """
-                SELECT amount, type, category, description, date
-                FROM transactions
-                WHERE user_id = ?
-                ORDER BY date ASC, id ASC
-                """
-            , (self.user_id,)).fetchall()
-        return rows
+        return iter_transactions(self.user_id)
+
+    def columnar_reports(self):
+        if self.backend != "columnar":
+            return None
+        if self._reports is None:
+            self._reports = compute_reports(self.get_data())
+        return self._reports
+
+    def use_sql(self):
+        if self.api_client or self.backend != "sql":
+            return False
+        init_db()
+        return True
+
+    def sql_totals(self):
+        return get_read_db().execute(
+            """
+            SELECT type, SUM(amount_cents) AS total
+            FROM transactions
+            WHERE user_id = ? AND type IN ('income', 'spending')
+            GROUP BY type
+            """,
+            (self.user_id,),
+        ).fetchall()
+
+    def sql_windows(self, periods):
+        # A row is in a window when it is at most ``days`` old, which is what
+        # the Python path's (now - date).days <= days works out to.
+        today = date.today()
+        starts = [(today - timedelta(days=int(days))).isoformat() for days in periods]
+        columns = ", ".join(
+            f"COALESCE(SUM(CASE WHEN date >= ? THEN amount_cents END), 0) AS d{days}" for days in periods
+        )
+        return get_read_db().execute(
+            f"""
+            SELECT type, {columns}
+            FROM transactions
+            WHERE user_id = ? AND type IN ('income', 'spending') AND date >= ?
+            GROUP BY type
+            """,
+            (*starts, self.user_id, min(starts)),
+        ).fetchall()
+
+    def sql_monthly(self, by_category=False):
+        category = ", category" if by_category else ""
+        return get_read_db().execute(
+            f"""
+            SELECT substr(date, 1, 4) AS year, substr(date, 6, 2) AS month, type{category},
+                SUM(amount_cents) AS total
+            FROM transactions
+            WHERE user_id = ? AND type IN ('income', 'spending')
+            GROUP BY substr(date, 1, 7), type{category}
+            ORDER BY substr(date, 1, 7)
+            """,
+            (self.user_id,),
+        ).fetchall()
+
+    def display_all_spending_income(self, income, spending):
+        print(f"You earned a total of ${format_cents(income)}")
+        print(f"And spent a total of ${format_cents(spending)}")
 
 
     def get_all_spending_income(self):
+        reports = self.columnar_reports()
+        if reports:
+            totals = reports["totals"]
+            self.display_all_spending_income(totals["income"], totals["spending"])
+            return
+        if self.api_client:
+            totals = self.api_client.get_stats(["totals"])["totals"]
+            self.display_all_spending_income(to_cents(totals["income"]), to_cents(totals["spending"]))
+            return
+        if self.use_sql():
+            totals = {"income": 0, "spending": 0}
+            for row in self.sql_totals():
+                totals[row["type"]] = row["total"]
+            self.display_all_spending_income(totals["income"], totals["spending"])
+            return
+
         lines = self.get_data()
         income = 0
         spending = 0
         
         for l in lines:
             if l["type"] == "income":
-                income += l["amount"]
+                income += l["amount_cents"]
             elif l["type"] == "spending":
-                spending += l["amount"]
+                spending += l["amount_cents"]
 
-        print(f"You earned a total of ${income}")
-        print(f"And spent a total of ${spending}")
+        self.display_all_spending_income(income, spending)
     
 
     def get_last_months_income_spending(self):
@@ -68,6 +154,27 @@ class RetrieveData:
             "360": {"income": 0, "spending": 0}
         }
 
+        reports = self.columnar_reports()
+        if reports:
+            for days, totals in reports["windows"].items():
+                last_months_data[str(days)] = totals
+            self.display_last_months_income_spending(last_months_data)
+            return
+        if self.api_client:
+            for window in self.api_client.get_stats(["windows"])["windows"]:
+                last_months_data[str(window["days"])] = {
+                    "income": to_cents(window["income"]),
+                    "spending": to_cents(window["spending"]),
+                }
+            self.display_last_months_income_spending(last_months_data)
+            return
+        if self.use_sql():
+            for row in self.sql_windows(list(last_months_data)):
+                for period in last_months_data:
+                    last_months_data[period][row["type"]] = row[f"d{period}"]
+            self.display_last_months_income_spending(last_months_data)
+            return
+
         lines = self.get_data()
         for l in lines:
             dt_obj = datetime.strptime(l["date"], "%Y-%m-%d")
@@ -76,7 +183,7 @@ class RetrieveData:
             # Don't break early
             for period in last_months_data:
                 if diff <= int(period):  # <= for inclusive logic
-                    last_months_data[period][l["type"]] += l["amount"]
+                    last_months_data[period][l["type"]] += l["amount_cents"]
         
         self.display_last_months_income_spending(last_months_data)
 
@@ -86,13 +193,34 @@ class RetrieveData:
         print("\n")
         for key, value in data.items():
             month = int(key) // 30
-            print(f"Last {month} months, you earned ${round(value['income'], 2)}")
-            print(f"And spent ${round(value['spending'], 2)}")
+            print(f"Last {month} months, you earned ${format_cents(value['income'])}")
+            print(f"And spent ${format_cents(value['spending'])}")
     
 
     def get_income_spending_per_month(self):
         calendar_data = {}
 
+        reports = self.columnar_reports()
+        if reports:
+            for year, month, amount_type, total in reports["monthly"]:
+                self.year_month_populate(calendar_data, year, month, amount_type, total)
+            self.display_income_spending_year_month(calendar_data)
+            return
+        if self.api_client:
+            for item in self.api_client.get_stats(["monthly"])["monthly"]:
+                year, month = item["month"].split("-")
+                for amount_type in ("income", "spending"):
+                    self.year_month_populate(
+                        calendar_data, year, month, amount_type, to_cents(item[amount_type])
+                    )
+            self.display_income_spending_year_month(calendar_data)
+            return
+        if self.use_sql():
+            for row in self.sql_monthly():
+                self.year_month_populate(calendar_data, row["year"], row["month"], row["type"], row["total"])
+            self.display_income_spending_year_month(calendar_data)
+            return
+
         lines = self.get_data()
 
         for l in lines:
@@ -107,10 +235,8 @@ class RetrieveData:
         month = dt_obj.strftime("%m")
 
         amount_type = data["type"]
-        spending = int(data["amount"]) if amount_type == "spending" else 0
-        income = int(data["amount"]) if amount_type == "income" else 0
         category = data["category"]
-        amount = spending if spending != 0 else income
+        amount = data["amount_cents"]
 
         # populate calendar
         if not includes_categories:
@@ -142,7 +268,7 @@ class RetrieveData:
             print(year)
             for month, v in value.items():
                 print(f"Month {month}: "
-                    + f"Income: ${v['income']} / Spending: ${v['spending']}"
+                    + f"Income: ${format_cents(v['income'])} / Spending: ${format_cents(v['spending'])}"
                 )
     
     def display_income_spending_per_category(self, calendar_data):
@@ -153,13 +279,53 @@ class RetrieveData:
                 print(f"\nMonth {month}")
                 for typ, categories in amount_type.items():
                     print(typ)
-                    print(sorted(categories.items(), key=lambda kv: (kv[1], kv[0]), reverse=True))
+                    ranked = sorted(categories.items(), key=lambda kv: (kv[1], kv[0]), reverse=True)
+                    print([(category, format_cents(total)) for category, total in ranked])
 
 
                 
     def get_income_spending_per_category(self):
         calendar_data = {}
+        reports = self.columnar_reports()
+        if reports:
+            for year, month, amount_type, category, total in reports["by_category"]:
+                self.category_populate(calendar_data, year, month, category, amount_type, total)
+            self.display_income_spending_per_category(calendar_data)
+            return
+        if self.api_client:
+            for item in self.api_client.get_stats(["monthly_by_category"])["monthly_by_category"]:
+                year, month = item["month"].split("-")
+                self.category_populate(
+                    calendar_data, year, month, item["category"], item["type"], to_cents(item["total"])
+                )
+            self.display_income_spending_per_category(calendar_data)
+            return
+        if self.use_sql():
+            for row in self.sql_monthly(by_category=True):
+                self.category_populate(
+                    calendar_data, row["year"], row["month"], row["category"], row["type"], row["total"]
+                )
+            self.display_income_spending_per_category(calendar_data)
+            return
+
         lines = self.get_data()
         for l in lines:
             self.populate_calendar(calendar_data, l, includes_categories=True)
         self.display_income_spending_per_category(calendar_data)
+
+
+def compare_backends(user_id, backends=("sql", "columnar")):
+    # Runs every local report through the Python reference and each of
+    # ``backends``; returns (report, backend) pairs whose output differs.
+    mismatches = []
+    for report in REPORTS:
+        outputs = {}
+        for backend in ("python", *backends):
+            buffer = io.StringIO()
+            with contextlib.redirect_stdout(buffer):
+                getattr(RetrieveData(user_id, backend=backend), report)()
+            outputs[backend] = buffer.getvalue()
+        for backend in backends:
+            if outputs[backend] != outputs["python"]:
+                mismatches.append((report, backend))
+    return mismatches
@@ -0,0 +1,136 @@
+import csv
+import os
+import re
+
+from money import format_cents
+from storage import insert_transactions
+from validation import normalize_transaction, parse_amount
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("MYBANK_IMPORT_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "ofx")
+
+_OFX_TAG = re.compile(r"<(/?)(\w+)>([^<\r\n]*)")
+
+
+class ImportFileError(ValueError):
+    # The file itself can't be read: not UTF-8, or not parseable as CSV.
+    def __init__(self, row, message):
+        super().__init__(message)
+        self.row = row
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    if explicit:
+        return explicit.lower() if explicit.lower() in FORMATS else None
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in ("ofx", "qfx"):
+        return "ofx"
+    if extension == "csv":
+        return "csv"
+    if content_type and "ofx" in content_type:
+        return "ofx"
+    return "csv"
+
+
+def _signed_record(amount, record):
+    # Bank exports usually carry the direction in the sign of the amount.
+    cents = parse_amount(amount)
+    if cents is not None and not record.get("type"):
+        record["type"] = "spending" if cents < 0 else "income"
+    if cents is not None and cents < 0 and record["type"] == "spending":
+        cents = -cents
+    record["amount"] = format_cents(cents) if cents is not None else amount
+    return record
+
+
+def iter_csv_records(lines):
+    # Expects a header row with amount, and optionally type, category,
+    # description and date (YYYY-MM-DD) columns.
+    reader = csv.DictReader(lines)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        record = {key: (value or "").strip() for key, value in row.items() if key}
+        if not record.get("category"):
+            record["category"] = "other"
+        yield reader.line_num, _signed_record(record.get("amount"), record)
+
+
+def iter_ofx_records(lines):
+    # Reads <STMTTRN> blocks line by line; handles both SGML (unclosed tags)
+    # and XML flavoured OFX.
+    fields = None
+    number = 0
+    for line in lines:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    fields = {}
+                elif fields is not None:
+                    number += 1
+                    yield number, _ofx_record(fields)
+                    fields = None
+            elif fields is not None and not closing:
+                fields[tag] = value.strip()
+
+
+def _ofx_record(fields):
+    posted = fields.get("DTPOSTED", "")[:8]
+    date = f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) == 8 else posted
+    description = " - ".join(part for part in (fields.get("NAME"), fields.get("MEMO")) if part)
+    record = {"category": "other", "description": description, "date": date}
+    return _signed_record(fields.get("TRNAMT"), record)
+
+
+def import_transactions(user_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    inserted = 0
+    error_count = 0
+    errors = []
+    chunk = []
+    for number, record in records:
+        tx, error = normalize_transaction(record)
+        if error:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": number, "error": error})
+            continue
+        chunk.append(tx)
+        if len(chunk) >= chunk_size:
+            inserted += insert_transactions(user_id, chunk)
+            chunk = []
+    if chunk:
+        inserted += insert_transactions(user_id, chunk)
+    return {"inserted": inserted, "error_count": error_count, "errors": errors}
+
+
+def _records(lines, file_format):
+    return iter_ofx_records(lines) if file_format == "ofx" else iter_csv_records(lines)
+
+
+def check_lines(lines, file_format="csv"):
+    # Reads every record once without storing anything, so a file that breaks
+    # part way through is rejected whole instead of leaving the chunks before
+    # the break imported. Raises ImportFileError.
+    number = 0
+    try:
+        for number, _ in _records(lines, file_format):
+            pass
+    except UnicodeDecodeError:
+        # Text is decoded ahead in blocks, so there is no reliable row here.
+        raise ImportFileError(None, "File is not UTF-8 text.") from None
+    except csv.Error as exc:
+        raise ImportFileError(number + 1, f"File is not valid CSV: {exc}.") from None
+
+
+def import_lines(user_id, lines, file_format="csv", chunk_size=IMPORT_CHUNK_SIZE):
+    return import_transactions(user_id, _records(lines, file_format), chunk_size)
+
+
+def import_file(user_id, path, file_format=None, chunk_size=IMPORT_CHUNK_SIZE):
+    file_format = detect_format(path, explicit=file_format)
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        check_lines(file, file_format)
+        file.seek(0)
+        return import_lines(user_id, file, file_format, chunk_size)
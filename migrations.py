@@ -0,0 +1,646 @@
+# Schema migrations, applied in order. The number of migrations applied so
+# far is stored in the database's PRAGMA user_version, so append new steps to
+# MIGRATIONS and never edit or reorder the existing ones.
+
+import sqlite3
+from datetime import date
+
+from recurring import next_charge_date
+
+
+def _create_base_schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            date TEXT NOT NULL,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS recurring_expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            billing_day INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            last_charged_date TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            user_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+    )
+
+    columns = conn.execute("PRAGMA table_info(transactions)").fetchall()
+    column_names = {col["name"] for col in columns}
+    if "user_id" not in column_names:
+        conn.execute("ALTER TABLE transactions ADD COLUMN user_id INTEGER")
+
+
+def _add_per_user_indexes(conn):
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+        ON transactions (user_id, date DESC, id DESC)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_type_category_date
+        ON transactions (user_id, type, category, date)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_recurring_expenses_user_active_start
+        ON recurring_expenses (user_id, active, start_date)
+        """
+    )
+
+
+def rebuild_monthly_rollups(conn, user_id=None):
+    if user_id is None:
+        conn.execute("DELETE FROM monthly_rollups")
+        where = "user_id IS NOT NULL"
+        params = ()
+    else:
+        conn.execute("DELETE FROM monthly_rollups WHERE user_id = ?", (user_id,))
+        where = "user_id = ?"
+        params = (user_id,)
+    conn.execute(
+        f"""
+        INSERT INTO monthly_rollups (user_id, month, type, category, total_cents, tx_count)
+        SELECT user_id, substr(date, 1, 7), type, category, SUM(amount_cents), COUNT(*)
+        FROM transactions
+        WHERE {where}
+        GROUP BY user_id, substr(date, 1, 7), type, category
+        """,
+        params,
+    )
+
+
+def _add_monthly_rollups(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, type, category),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """
+    )
+    # Triggers keep the rollups in the same transaction as the row change, so
+    # single inserts, recurring charges and bulk paths all stay consistent.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_insert
+        AFTER INSERT ON transactions
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            INSERT INTO monthly_rollups (user_id, month, type, category, total, tx_count)
+            VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.type, NEW.category, NEW.amount, 1)
+            ON CONFLICT (user_id, month, type, category)
+            DO UPDATE SET total = total + excluded.total, tx_count = tx_count + 1;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_delete
+        AFTER DELETE ON transactions
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+            UPDATE monthly_rollups
+            SET total = total - OLD.amount, tx_count = tx_count - 1
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category;
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category AND tx_count <= 0;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_update
+        AFTER UPDATE OF amount, type, category, date, user_id ON transactions
+        BEGIN
+            UPDATE monthly_rollups
+            SET total = total - OLD.amount, tx_count = tx_count - 1
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category;
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category AND tx_count <= 0;
+            INSERT INTO monthly_rollups (user_id, month, type, category, total, tx_count)
+            SELECT NEW.user_id, substr(NEW.date, 1, 7), NEW.type, NEW.category, NEW.amount, 1
+            WHERE NEW.user_id IS NOT NULL
+            ON CONFLICT (user_id, month, type, category)
+            DO UPDATE SET total = total + excluded.total, tx_count = tx_count + 1;
+        END
+        """
+    )
+    # The REAL-amount schema of this step; migration 9 rebuilds in cents.
+    conn.execute(
+        """
+        INSERT INTO monthly_rollups (user_id, month, type, category, total, tx_count)
+        SELECT user_id, substr(date, 1, 7), type, category, SUM(amount), COUNT(*)
+        FROM transactions
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, substr(date, 1, 7), type, category
+        """
+    )
+
+
+def _add_user_data_version(conn):
+    columns = conn.execute("PRAGMA table_info(users)").fetchall()
+    if "data_version" not in {col["name"] for col in columns}:
+        conn.execute("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+    # Every change to a user's transactions bumps their data_version, which
+    # caches use to tell whether what they hold is still current.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_insert
+        AFTER INSERT ON transactions
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_delete
+        AFTER DELETE ON transactions
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+            UPDATE users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_update
+        AFTER UPDATE ON transactions
+        BEGIN
+            UPDATE users SET data_version = data_version + 1
+            WHERE id IN (OLD.user_id, NEW.user_id);
+        END
+        """
+    )
+
+
+def _create_fts_triggers(conn):
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert
+        AFTER INSERT ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (rowid, description, category, type, date, user_id)
+            VALUES (NEW.id, NEW.description, NEW.category, NEW.type, NEW.date, NEW.user_id);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete
+        AFTER DELETE ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, category, type, date, user_id)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category, OLD.type, OLD.date, OLD.user_id);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+        AFTER UPDATE OF description, category, type, date, user_id ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, category, type, date, user_id)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category, OLD.type, OLD.date, OLD.user_id);
+            INSERT INTO transactions_fts (rowid, description, category, type, date, user_id)
+            VALUES (NEW.id, NEW.description, NEW.category, NEW.type, NEW.date, NEW.user_id);
+        END
+        """
+    )
+
+
+def _add_transactions_fts(conn):
+    # External-content FTS5 index over the searchable columns. user_id is
+    # indexed too so a search can be narrowed to one user inside the index.
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+                description, category, type, date, user_id,
+                content='transactions', content_rowid='id', prefix='2 3'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; searches fall back to LIKE.
+        return
+    _create_fts_triggers(conn)
+    conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+
+def _add_recurring_next_due_date(conn):
+    columns = conn.execute("PRAGMA table_info(recurring_expenses)").fetchall()
+    if "next_due_date" not in {col["name"] for col in columns}:
+        conn.execute("ALTER TABLE recurring_expenses ADD COLUMN next_due_date TEXT")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_recurring_expenses_due
+        ON recurring_expenses (active, next_due_date)
+        """
+    )
+    rows = conn.execute(
+        "SELECT id, billing_day, start_date, last_charged_date FROM recurring_expenses"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE recurring_expenses SET next_due_date = ? WHERE id = ?",
+        [
+            (
+                next_charge_date(
+                    date.fromisoformat(row["start_date"]),
+                    row["billing_day"],
+                    date.fromisoformat(row["last_charged_date"]) if row["last_charged_date"] else None,
+                ).isoformat(),
+                row["id"],
+            )
+            for row in rows
+        ],
+    )
+
+
+def _add_recurring_frequency(conn):
+    columns = conn.execute("PRAGMA table_info(recurring_expenses)").fetchall()
+    if "frequency" not in {col["name"] for col in columns}:
+        conn.execute(
+            "ALTER TABLE recurring_expenses ADD COLUMN frequency TEXT NOT NULL DEFAULT 'monthly'"
+        )
+
+
+def _create_version_triggers(conn, amount_column):
+    # Every change bumps the owner's data_version and stamps the row with it,
+    # or leaves a tombstone. The stamping UPDATE only touches version and
+    # updated_at, which no transactions trigger listens to.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_insert
+        AFTER INSERT ON transactions
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            UPDATE users SET data_version = data_version + 1 WHERE id = NEW.user_id;
+            UPDATE transactions
+            SET version = (SELECT data_version FROM users WHERE id = NEW.user_id),
+                updated_at = datetime('now')
+            WHERE id = NEW.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_delete
+        AFTER DELETE ON transactions
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+            UPDATE users SET data_version = data_version + 1 WHERE id = OLD.user_id;
+            INSERT OR REPLACE INTO transaction_tombstones (user_id, id, version, deleted_at)
+            SELECT OLD.user_id, OLD.id, data_version, datetime('now')
+            FROM users WHERE id = OLD.user_id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_version_update
+        AFTER UPDATE OF {amount_column}, type, category, description, date, user_id ON transactions
+        BEGIN
+            UPDATE users SET data_version = data_version + 1
+            WHERE id IN (OLD.user_id, NEW.user_id);
+            INSERT OR REPLACE INTO transaction_tombstones (user_id, id, version, deleted_at)
+            SELECT OLD.user_id, OLD.id, data_version, datetime('now')
+            FROM users WHERE id = OLD.user_id AND OLD.user_id IS NOT NEW.user_id;
+            UPDATE transactions
+            SET version = COALESCE((SELECT data_version FROM users WHERE id = NEW.user_id), 0),
+                updated_at = datetime('now')
+            WHERE id = NEW.id;
+        END
+        """
+    )
+
+
+def _add_transaction_change_tracking(conn):
+    # Each row (and each tombstone left by a delete) records the owner's
+    # data_version at the time of its last change, so "everything changed
+    # since watermark N" is a range scan on version.
+    columns = {col["name"] for col in conn.execute("PRAGMA table_info(transactions)").fetchall()}
+    if "version" not in columns:
+        conn.execute("ALTER TABLE transactions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    if "updated_at" not in columns:
+        conn.execute("ALTER TABLE transactions ADD COLUMN updated_at TEXT")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_version
+        ON transactions (user_id, version)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transaction_tombstones (
+            user_id INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            deleted_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transaction_tombstones_user_version
+        ON transaction_tombstones (user_id, version)
+        """
+    )
+
+    # Give existing rows distinct versions above each user's current one.
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_version_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_version_delete")
+    conn.execute("DROP TRIGGER IF EXISTS trg_transactions_version_update")
+    versions = {
+        row["id"]: row["data_version"]
+        for row in conn.execute("SELECT id, data_version FROM users").fetchall()
+    }
+    updates = []
+    for row in conn.execute(
+        "SELECT id, user_id FROM transactions WHERE user_id IS NOT NULL ORDER BY user_id, id"
+    ).fetchall():
+        if row["user_id"] in versions:
+            versions[row["user_id"]] += 1
+            updates.append((versions[row["user_id"]], row["id"]))
+    conn.executemany(
+        "UPDATE transactions SET version = ?, updated_at = datetime('now') WHERE id = ?", updates
+    )
+    conn.executemany(
+        "UPDATE users SET data_version = ? WHERE id = ?",
+        [(version, user_id) for user_id, version in versions.items()],
+    )
+
+    _create_version_triggers(conn, "amount")
+
+
+def _rebuild_table(conn, table, create_sql, columns, cents_column):
+    # SQLite can't change a column's type in place: copy into a new table
+    # (cents_column is filled from the old REAL amount), keep the
+    # AUTOINCREMENT counter so deleted ids are never handed out again, then
+    # swap the tables. Dropping the old one drops its triggers and indexes;
+    # callers recreate them.
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    conn.execute(create_sql.format(table=f"{table}_new"))
+    select_columns = [
+        "CAST(ROUND(amount * 100) AS INTEGER)" if column == cents_column else column
+        for column in columns
+    ]
+    conn.execute(
+        f"INSERT INTO {table}_new ({', '.join(columns)}) "
+        f"SELECT {', '.join(select_columns)} FROM {table}"
+    )
+    if sequence:
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (f"{table}_new",))
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (f"{table}_new", sequence["seq"])
+        )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _store_amounts_in_cents(conn):
+    # Money becomes INTEGER cents: amount_cents on transactions and
+    # recurring_expenses, total_cents on the rollups. REAL amounts are
+    # rounded to the nearest cent once, here.
+    _rebuild_table(
+        conn,
+        "transactions",
+        """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount_cents INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            date TEXT NOT NULL,
+            user_id INTEGER,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        [
+            "id", "amount_cents", "type", "category", "description", "date", "user_id", "version",
+            "updated_at",
+        ],
+        "amount_cents",
+    )
+    _add_per_user_indexes(conn)
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_version
+        ON transactions (user_id, version)
+        """
+    )
+    _create_version_triggers(conn, "amount_cents")
+    fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+    ).fetchone()
+    if fts:
+        # Row ids and indexed columns are unchanged, so the index stays valid.
+        _create_fts_triggers(conn)
+
+    _rebuild_table(
+        conn,
+        "recurring_expenses",
+        """
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount_cents INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            billing_day INTEGER NOT NULL,
+            frequency TEXT NOT NULL DEFAULT 'monthly',
+            start_date TEXT NOT NULL,
+            last_charged_date TEXT,
+            next_due_date TEXT,
+            active INTEGER NOT NULL DEFAULT 1,
+            user_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """,
+        [
+            "id", "amount_cents", "category", "description", "billing_day", "frequency",
+            "start_date", "last_charged_date", "next_due_date", "active", "user_id", "created_at",
+        ],
+        "amount_cents",
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_recurring_expenses_user_active_start
+        ON recurring_expenses (user_id, active, start_date)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_recurring_expenses_due
+        ON recurring_expenses (active, next_due_date)
+        """
+    )
+
+    conn.execute("DROP TABLE monthly_rollups")
+    conn.execute(
+        """
+        CREATE TABLE monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, type, category),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER trg_transactions_rollup_insert
+        AFTER INSERT ON transactions
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+            INSERT INTO monthly_rollups (user_id, month, type, category, total_cents, tx_count)
+            VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.type, NEW.category, NEW.amount_cents, 1)
+            ON CONFLICT (user_id, month, type, category)
+            DO UPDATE SET total_cents = total_cents + excluded.total_cents, tx_count = tx_count + 1;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER trg_transactions_rollup_delete
+        AFTER DELETE ON transactions
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+            UPDATE monthly_rollups
+            SET total_cents = total_cents - OLD.amount_cents, tx_count = tx_count - 1
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category;
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category AND tx_count <= 0;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER trg_transactions_rollup_update
+        AFTER UPDATE OF amount_cents, type, category, date, user_id ON transactions
+        BEGIN
+            UPDATE monthly_rollups
+            SET total_cents = total_cents - OLD.amount_cents, tx_count = tx_count - 1
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category;
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7)
+                AND type = OLD.type AND category = OLD.category AND tx_count <= 0;
+            INSERT INTO monthly_rollups (user_id, month, type, category, total_cents, tx_count)
+            SELECT NEW.user_id, substr(NEW.date, 1, 7), NEW.type, NEW.category, NEW.amount_cents, 1
+            WHERE NEW.user_id IS NOT NULL
+            ON CONFLICT (user_id, month, type, category)
+            DO UPDATE SET total_cents = total_cents + excluded.total_cents, tx_count = tx_count + 1;
+        END
+        """
+    )
+    rebuild_monthly_rollups(conn)
+
+
+def _add_api_tokens(conn):
+    # Only a SHA-256 of each token is kept; tokens are random enough that a
+    # fast hash is safe, and the unique index makes the lookup one probe.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token_hash TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_api_tokens_user ON api_tokens (user_id)")
+
+
+MIGRATIONS = [
+    _create_base_schema,
+    _add_per_user_indexes,
+    _add_monthly_rollups,
+    _add_user_data_version,
+    _add_transactions_fts,
+    _add_recurring_next_due_date,
+    _add_recurring_frequency,
+    _add_transaction_change_tracking,
+    _store_amounts_in_cents,
+    _add_api_tokens,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    current = schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return False
+
+    for number in range(current + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS[number - 1]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock.
+            if schema_version(conn) < number:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return True
@@ -0,0 +1,122 @@
+# Local copy of the account's transactions for API mode. Each sync pulls only
+# what changed on the server since the stored watermark.
+
+import os
+import sqlite3
+
+from money import to_cents
+
+MIRROR_PATH = os.environ.get(
+    "MYBANK_MIRROR_PATH", os.path.join(os.path.expanduser("~"), ".mybank", "mirror.db")
+)
+SYNC_PAGE_SIZE = 1000
+# Bump when the table layout changes; older mirrors are dropped and refetched.
+SCHEMA_VERSION = 2
+
+
+def connect(path=MIRROR_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        conn.execute("DROP TABLE IF EXISTS transactions")
+        conn.execute("DROP TABLE IF EXISTS meta")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            amount_cents INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            date TEXT NOT NULL,
+            updated_at TEXT,
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, id)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.commit()
+    return conn
+
+
+def _meta(conn):
+    return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+
+
+def _clear(conn):
+    conn.execute("DELETE FROM transactions")
+    conn.execute("DELETE FROM meta")
+
+
+def sync(api_client, conn, page_size=SYNC_PAGE_SIZE):
+    meta = _meta(conn)
+    since = 0
+    if meta.get("source") == api_client.base_url:
+        since = int(meta.get("watermark", "0"))
+    applied = 0
+    while True:
+        data = api_client.get_changes(since, page_size)
+        same_account = (
+            meta.get("source") == api_client.base_url
+            and meta.get("user_id") == str(data["user_id"])
+        )
+        if since and not same_account:
+            # Another server or account than the one mirrored: start over.
+            since = 0
+            continue
+        with conn:
+            if data["reset"] or not same_account:
+                _clear(conn)
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO transactions
+                    (id, amount_cents, type, category, description, date, updated_at, version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        row["id"],
+                        to_cents(row["amount"]),
+                        row["type"],
+                        row["category"],
+                        row["description"],
+                        row["date"],
+                        row["updated_at"],
+                        row["version"],
+                    )
+                    for row in data["changes"]
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM transactions WHERE id = ?", [(tx_id,) for tx_id in data["deleted"]]
+            )
+            meta = {
+                "source": api_client.base_url,
+                "user_id": str(data["user_id"]),
+                "watermark": str(data["watermark"]),
+            }
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+        applied += len(data["changes"]) + len(data["deleted"])
+        since = data["watermark"]
+        if not data["has_more"]:
+            return applied
+
+
+def iter_transactions(conn):
+    return conn.execute(
+        """
+        SELECT id, amount_cents, type, category, description, date
+        FROM transactions
+        ORDER BY date ASC, id ASC
+        """
+    )
+
+
+def remove(path=MIRROR_PATH):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,35 @@
+# Amounts are stored, summed and compared as integer cents. These helpers
+# convert at the edges: user input, JSON and display.
+
+from decimal import ROUND_HALF_UP, Decimal
+
+# Largest magnitude that still round-trips through a JSON float exactly.
+MAX_CENTS = 2**53 - 1
+_MAX_DOLLARS = Decimal(MAX_CENTS) / 100
+
+
+def to_cents(raw):
+    # "12.34", 12.34 and "1e2" all parse; half a cent rounds away from zero.
+    if isinstance(raw, bool) or raw is None:
+        return None
+    try:
+        value = Decimal(str(raw).strip())
+        if not value.is_finite() or value.copy_abs() > _MAX_DOLLARS:
+            return None
+        return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except ArithmeticError:
+        # InvalidOperation for text that isn't a number, Overflow for
+        # exponents beyond the decimal context.
+        return None
+
+
+def to_dollars(cents):
+    # For JSON: the float closest to the decimal amount, e.g. 1234 -> 12.34.
+    return cents / 100
+
+
+def format_cents(cents, grouping=False):
+    sign = "-" if cents < 0 else ""
+    dollars, remainder = divmod(abs(int(cents)), 100)
+    whole = f"{dollars:,}" if grouping else str(dollars)
+    return f"{sign}{whole}.{remainder:02d}"
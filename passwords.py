@@ -0,0 +1,76 @@
+# Password hashing and verification. The web app runs them on a small process
+# pool (start_pool) so a burst of logins can't starve request threads of the
+# one CPU; without a pool, e.g. in the CLI, they run inline.
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Any werkzeug method with its cost spelled out, e.g. "scrypt:16384:8:1" or
+# "pbkdf2:sha256:600000". Stored hashes made with another method are replaced
+# at the user's next login.
+PASSWORD_HASH_METHOD = os.environ.get("MYBANK_PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+HASH_WORKERS = int(os.environ.get("MYBANK_HASH_WORKERS", "1"))
+# Hashes allowed to wait for a worker; beyond that callers get HashingBusy.
+HASH_QUEUE = int(os.environ.get("MYBANK_HASH_QUEUE", "8"))
+
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def start_pool(workers=HASH_WORKERS, queue=HASH_QUEUE):
+    # Idempotent per process: a pool inherited through fork is not usable in
+    # the child, so a forked process gets its own on its first call.
+    global _pool, _pool_pid, _slots
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            return
+        if workers < 1:
+            _pool = _slots = None
+            return
+        # forkserver children don't inherit the caller's threads, locks or
+        # database connections.
+        context = multiprocessing.get_context("forkserver")
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        _pool_pid = os.getpid()
+        _slots = threading.BoundedSemaphore(workers + queue)
+
+
+def stop_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = _slots = None
+
+
+def _run(func, *args):
+    if _pool is None or _pool_pid != os.getpid():
+        return func(*args)
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return _pool.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return not password_hash.startswith(PASSWORD_HASH_METHOD + "$")
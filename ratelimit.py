@@ -0,0 +1,59 @@
+# In-memory token buckets. Each key holds two numbers (tokens left, time of
+# the last update) and the least recently seen keys are evicted once the
+# table is full, so memory stays bounded whatever keys clients make up.
+# Limits are per process.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_rate(spec):
+    # "10/60" allows bursts of 10 requests, refilled at 10 per 60 seconds;
+    # "10" means 10 per second. Empty, "0" or "off" turns the limit off.
+    spec = (spec or "").strip().lower()
+    if spec in ("", "0", "off"):
+        return None
+    count, _, seconds = spec.partition("/")
+    return int(count), float(seconds or "1")
+
+
+class RateLimiter:
+    def __init__(self, limit, period, max_keys):
+        self.limit = limit
+        self.rate = limit / period
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec, max_keys):
+        rate = parse_rate(spec)
+        return cls(*rate, max_keys) if rate else None
+
+    def acquire(self, key, now=None):
+        # Takes a token for key. Returns 0 when one was available, otherwise
+        # the seconds until there will be one.
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                tokens = self.limit
+            else:
+                tokens = min(self.limit, bucket[0] + (now - bucket[1]) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
@@ -0,0 +1,68 @@
+from calendar import monthrange
+from datetime import date, timedelta
+
+# Weekly schedules repeat every N days from start_date; monthly and yearly
+# ones land on billing_day (clamped to the month's length).
+FREQUENCIES = ["weekly", "biweekly", "monthly", "yearly"]
+_DAY_STEPS = {"weekly": 7, "biweekly": 14}
+
+
+def add_month(dt):
+    if dt.month == 12:
+        return date(dt.year + 1, 1, 1)
+    return date(dt.year, dt.month + 1, 1)
+
+
+def charge_date_for_month(year, month, billing_day):
+    last_day = monthrange(year, month)[1]
+    return date(year, month, min(billing_day, last_day))
+
+
+def _month_index(dt):
+    return dt.year * 12 + dt.month - 1
+
+
+def occurrence(first_date, billing_day, frequency, index):
+    # The charge ``index`` steps after first_date, which must itself be a
+    # charge date of the schedule.
+    if frequency in _DAY_STEPS:
+        return first_date + timedelta(days=_DAY_STEPS[frequency] * index)
+    if frequency == "yearly":
+        return charge_date_for_month(first_date.year + index, first_date.month, billing_day)
+    year, month = divmod(_month_index(first_date) + index, 12)
+    return charge_date_for_month(year, month + 1, billing_day)
+
+
+def next_charge_date(start_date, billing_day, last_charged_date=None, frequency="monthly"):
+    # First charge on or after start_date and strictly after the last charge.
+    if frequency in _DAY_STEPS:
+        if not last_charged_date or last_charged_date < start_date:
+            return start_date
+        step = _DAY_STEPS[frequency]
+        return start_date + timedelta(days=((last_charged_date - start_date).days // step + 1) * step)
+
+    floor = start_date
+    if last_charged_date and last_charged_date > floor:
+        floor = last_charged_date
+    if frequency == "yearly":
+        candidate = charge_date_for_month(floor.year, start_date.month, billing_day)
+    else:
+        candidate = charge_date_for_month(floor.year, floor.month, billing_day)
+    if candidate < start_date or (last_charged_date and candidate <= last_charged_date):
+        candidate = occurrence(candidate, billing_day, frequency, 1)
+    return candidate
+
+
+def due_count(next_due_date, billing_day, frequency, today):
+    if next_due_date > today:
+        return 0
+    if frequency in _DAY_STEPS:
+        return (today - next_due_date).days // _DAY_STEPS[frequency] + 1
+    if frequency == "yearly":
+        count = today.year - next_due_date.year + 1
+    else:
+        count = _month_index(today) - _month_index(next_due_date) + 1
+    if occurrence(next_due_date, billing_day, frequency, count - 1) > today:
+        count -= 1
+    return count
+
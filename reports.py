@@ -0,0 +1,202 @@
+# Columnar report engine: computes every RetrieveData report in one pass over
+# raw transaction rows. NumPy is optional; without it the same results come
+# from a single plain-Python loop.
+#
+#   python -m reports [rows]   benchmark on synthetic rows (default 1,000,000)
+
+import io
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TYPES = ("income", "spending")
+WINDOW_DAYS = (30, 90, 120, 360)
+
+
+def compute_reports(rows, today=None, use_numpy=None):
+    # Returns totals and windows as sums of integer cents, and
+    # monthly/by_category as lists ordered by month.
+    today = today or date.today()
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return _numpy_reports(load_columns(rows), today)
+    return _python_reports(rows, today)
+
+
+def load_columns(rows):
+    amounts, dates, types, categories = [], [], [], []
+    for row in rows:
+        amounts.append(row["amount_cents"])
+        dates.append(row["date"])
+        types.append(row["type"])
+        categories.append(row["category"])
+    types = np.array(types)
+    category_names, category_codes = np.unique(
+        np.array(categories, dtype=str), return_inverse=True
+    )
+    return {
+        "amount": np.array(amounts, dtype=np.int64),
+        "date": np.array(dates, dtype="datetime64[D]"),
+        "type": (types == "spending").astype(np.int64),
+        "known_type": (types == "income") | (types == "spending"),
+        "category": category_codes.reshape(-1).astype(np.int64),
+        "category_names": [str(name) for name in category_names],
+    }
+
+
+def _numpy_reports(columns, today):
+    known = columns["known_type"]
+    amount = columns["amount"][known]
+    day = columns["date"][known]
+    tx_type = columns["type"][known]
+    category = columns["category"][known]
+    names = columns["category_names"]
+
+    totals = _by_type(tx_type, amount)
+    age = (np.datetime64(today, "D") - day).astype(np.int64)
+    windows = {}
+    for days in WINDOW_DAYS:
+        in_window = age <= days
+        windows[days] = _by_type(tx_type[in_window], amount[in_window])
+
+    months, month_index = np.unique(day.astype("datetime64[M]"), return_inverse=True)
+    month_index = month_index.reshape(-1)
+    month_type = month_index * 2 + tx_type
+    groups = len(months) * 2
+    sums = np.bincount(month_type, weights=amount, minlength=groups)
+    counts = np.bincount(month_type, minlength=groups)
+    monthly = []
+    for group in np.flatnonzero(counts):
+        month, type_code = divmod(int(group), 2)
+        year_month = str(months[month])
+        monthly.append((year_month[:4], year_month[5:7], TYPES[type_code], int(sums[group])))
+
+    month_type_category = month_type * len(names) + category
+    groups *= len(names)
+    sums = np.bincount(month_type_category, weights=amount, minlength=groups)
+    counts = np.bincount(month_type_category, minlength=groups)
+    by_category = []
+    for group in np.flatnonzero(counts):
+        rest, category_code = divmod(int(group), len(names))
+        month, type_code = divmod(rest, 2)
+        year_month = str(months[month])
+        by_category.append(
+            (
+                year_month[:4],
+                year_month[5:7],
+                TYPES[type_code],
+                names[category_code],
+                int(sums[group]),
+            )
+        )
+
+    return {"totals": totals, "windows": windows, "monthly": monthly, "by_category": by_category}
+
+
+def _by_type(tx_type, amount):
+    # bincount sums in float64, which is exact for totals below 2**53 cents.
+    sums = np.bincount(tx_type, weights=amount, minlength=2)
+    return {name: int(sums[code]) for code, name in enumerate(TYPES)}
+
+
+def _python_reports(rows, today):
+    starts = [(days, (today - timedelta(days=days)).isoformat()) for days in WINDOW_DAYS]
+    totals = {"income": 0, "spending": 0}
+    windows = {days: {"income": 0, "spending": 0} for days in WINDOW_DAYS}
+    monthly = {}
+    by_category = {}
+    for row in rows:
+        tx_type = row["type"]
+        if tx_type not in totals:
+            continue
+        amount = row["amount_cents"]
+        tx_date = row["date"]
+        totals[tx_type] += amount
+        for days, start in starts:
+            if tx_date >= start:
+                windows[days][tx_type] += amount
+        month = tx_date[:7]
+        monthly[month, tx_type] = monthly.get((month, tx_type), 0) + amount
+        key = (month, tx_type, row["category"])
+        by_category[key] = by_category.get(key, 0) + amount
+
+    return {
+        "totals": totals,
+        "windows": windows,
+        "monthly": [
+            (month[:4], month[5:7], tx_type, total)
+            for (month, tx_type), total in sorted(monthly.items())
+        ],
+        "by_category": [
+            (month[:4], month[5:7], tx_type, category, total)
+            for (month, tx_type, category), total in sorted(by_category.items())
+        ],
+    }
+
+
+def synthetic_rows(count, seed=1):
+    from storage import INCOME_CATEGORIES, SPENDING_CATEGORIES
+
+    rnd = random.Random(seed)
+    first_day = date.today() - timedelta(days=5 * 365)
+    rows = []
+    for _ in range(count):
+        tx_type = "income" if rnd.random() < 0.2 else "spending"
+        categories = INCOME_CATEGORIES if tx_type == "income" else SPENDING_CATEGORIES
+        rows.append(
+            {
+                "amount_cents": rnd.randint(1, 500000),
+                "type": tx_type,
+                "category": rnd.choice(categories),
+                "description": "",
+                "date": (first_day + timedelta(days=rnd.randint(0, 5 * 365 + 30))).isoformat(),
+            }
+        )
+    rows.sort(key=lambda row: row["date"])
+    return rows
+
+
+def _timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<42} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def benchmark(count):
+    from data import REPORTS, RetrieveData
+
+    rows = _timed(f"generate {count:,} rows", lambda: synthetic_rows(count))
+
+    def reference():
+        # The per-row RetrieveData path, fed the rows instead of the database.
+        retriever = RetrieveData(None, backend="python")
+        retriever.get_data = lambda: rows
+        with redirect_stdout(io.StringIO()):
+            for report in REPORTS:
+                getattr(retriever, report)()
+
+    _timed("per-row reference (4 reports)", reference)
+    python_result = _timed(
+        "columnar, pure Python (4 reports)", lambda: compute_reports(rows, use_numpy=False)
+    )
+    if np is None:
+        print("NumPy is not installed; skipping the vectorized engine.")
+        return
+    columns = _timed("columnar, NumPy: load columns", lambda: load_columns(rows))
+    numpy_result = _timed(
+        "columnar, NumPy: 4 reports", lambda: _numpy_reports(columns, date.today())
+    )
+    print(f"NumPy and pure-Python results match: {numpy_result == python_result}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
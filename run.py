@@ -1,66 +1,68 @@
 import json
 import os
+import socket
 import sys
 from getpass import getpass
 
+import requests
+
+import mirror
 from api_client import APIClient
 from bank import Money
-from data import RetrieveData
-from storage import authenticate_user, get_user_by_id, init_db
+from data import RetrieveData, compare_backends
+from importer import ImportFileError, detect_format, import_file
+from storage import authenticate_user, get_user_by_id, init_db, rebuild_monthly_rollups
 
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".mybank")
 CONFIG_PATH = os.path.join(CONFIG_DIR, "credentials.json")
 
 
-def load_saved_user():
+def _read_config():
     if not os.path.exists(CONFIG_PATH):
-        return None
+        return {}
     try:
         with open(CONFIG_PATH) as file:
             data = json.load(file)
     except (json.JSONDecodeError, OSError):
-        return None
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _update_config(**fields):
+    # Merges into what is saved, so the saved login and the API token never
+    # overwrite each other. The file can hold a bearer token, so it is kept
+    # readable by its owner only, even if an older version created it 0644.
+    data = _read_config()
+    data.update(fields)
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    fd = os.open(CONFIG_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with open(fd, "w") as file:
+        json.dump(data, file)
 
-    user_id = data.get("user_id")
+
+def load_saved_user():
+    user_id = _read_config().get("user_id")
     if not user_id:
         return None
     return get_user_by_id(user_id)
 
 
 def save_user(user):
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    with open(CONFIG_PATH, "w") as file:
-        json.dump({"user_id": user["id"], "email": user["email"]}, file)
+    _update_config(user_id=user["id"], email=user["email"])
 
 
-def load_saved_api_session(api_url):
-    if not os.path.exists(CONFIG_PATH):
-        return None
-    try:
-        with open(CONFIG_PATH) as file:
-            data = json.load(file)
-    except (json.JSONDecodeError, OSError):
-        return None
-    api_data = data.get("api")
+def load_saved_api_token(api_url):
+    api_data = _read_config().get("api")
     if not api_data:
         return None
-    if api_data.get("url") != api_url:
+    if api_data.get("url") != api_url or not api_data.get("token"):
         return None
-    return api_data.get("cookies") or {}
+    return api_data
 
 
-def save_api_session(api_url, cookies):
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    data = {}
-    if os.path.exists(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH) as file:
-                data = json.load(file)
-        except (json.JSONDecodeError, OSError):
-            data = {}
-    data["api"] = {"url": api_url, "cookies": cookies}
-    with open(CONFIG_PATH, "w") as file:
-        json.dump(data, file)
+def save_api_token(api_url, token_id, token):
+    _update_config(api={"url": api_url, "token_id": token_id, "token": token})
 
 
 def clear_saved_user():
@@ -71,13 +73,42 @@ def clear_saved_user():
 
 
 if "--logout" in sys.argv:
+    api_url = os.environ.get("MYBANK_API_URL")
+    saved_token = load_saved_api_token(api_url) if api_url else None
+    if saved_token:
+        api_client = APIClient(api_url)
+        api_client.set_token(saved_token["token"])
+        try:
+            api_client.revoke_token(saved_token["token_id"])
+        except requests.RequestException:
+            print("Could not reach the server; the API token was not revoked.")
     clear_saved_user()
+    mirror.remove()
     print("Saved CLI session cleared.")
     raise SystemExit(0)
 
-print("Welcome to MyBank, would you like to:")
-print("1 - Add income/spending")
-print("2 - See stats")
+if "--rebuild-rollups" in sys.argv:
+    init_db()
+    rebuild_monthly_rollups()
+    print("Monthly rollups rebuilt.")
+    raise SystemExit(0)
+
+check_reports = "--check-reports" in sys.argv
+import_path = None
+if check_reports:
+    pass
+elif len(sys.argv) > 1 and sys.argv[1] == "import":
+    if len(sys.argv) < 3:
+        print("Usage: python run.py import <file.csv|file.ofx>")
+        raise SystemExit(1)
+    import_path = sys.argv[2]
+    if not os.path.exists(import_path):
+        print(f"File not found: {import_path}")
+        raise SystemExit(1)
+else:
+    print("Welcome to MyBank, would you like to:")
+    print("1 - Add income/spending")
+    print("2 - See stats")
 
 api_url = os.environ.get("MYBANK_API_URL")
 api_client = None
@@ -85,16 +116,19 @@ user_id = None
 
 if api_url:
     api_client = APIClient(api_url)
-    saved_cookies = load_saved_api_session(api_url)
-    if saved_cookies:
-        api_client.set_cookies(saved_cookies)
-    if not saved_cookies or not api_client.is_authenticated():
+    # A saved token is only replaced when the server no longer accepts it,
+    # e.g. after it was revoked.
+    saved_token = load_saved_api_token(api_url)
+    if saved_token:
+        api_client.set_token(saved_token["token"])
+    if not saved_token or not api_client.is_authenticated():
         email = input("Email: ").strip().lower()
         password = getpass("Password: ")
-        if not api_client.login(email, password):
+        token = api_client.create_token(email, password, name=f"cli@{socket.gethostname()}")
+        if not token:
             print("Invalid email or password.")
             raise SystemExit(1)
-        save_api_session(api_url, api_client.get_cookies())
+        save_api_token(api_url, token["id"], token["token"])
 else:
     init_db()
     user = load_saved_user()
@@ -110,6 +144,36 @@ else:
             save_user(user)
     user_id = user["id"]
 
+if import_path:
+    try:
+        if api_client:
+            result = api_client.import_file(import_path, detect_format(import_path))
+        else:
+            result = import_file(user_id, import_path)
+    except ImportFileError as exc:
+        result = {"error": "invalid_file", "row": exc.row, "message": str(exc)}
+    if result.get("error"):
+        where = f" (row {result['row']})" if result.get("row") else ""
+        print(f"Nothing imported{where}: {result['message']}")
+        raise SystemExit(1)
+    print(f"Imported {result['inserted']} transactions.")
+    for error in result["errors"]:
+        print(f"Row {error['row']}: {error['error']}")
+    if result["error_count"] > len(result["errors"]):
+        print(f"...and {result['error_count'] - len(result['errors'])} more rows with errors.")
+    raise SystemExit(0)
+
+if check_reports:
+    if api_client:
+        print("--check-reports compares the local report backends; unset MYBANK_API_URL.")
+        raise SystemExit(1)
+    mismatches = compare_backends(user_id)
+    for report, backend in mismatches:
+        print(f"Report {report} differs between the {backend} and python backends.")
+    if not mismatches:
+        print("All report backends agree with the python backend.")
+    raise SystemExit(1 if mismatches else 0)
+
 choice = input("-> ")
 
 if choice == "1":
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+from storage import close_db, init_db, process_due_recurring_expenses
+
+SCHEDULER_INTERVAL = int(os.environ.get("MYBANK_SCHEDULER_INTERVAL", "0"))
+SCHEDULER_BATCH_SIZE = int(os.environ.get("MYBANK_SCHEDULER_BATCH_SIZE", "500"))
+
+_lock = threading.Lock()
+_last_run_day = None
+_thread = None
+
+
+def run_due(today=None, batch_size=SCHEDULER_BATCH_SIZE):
+    # Each batch commits on its own so a long backlog never holds the writer
+    # for more than batch_size recurring expenses at a time.
+    global _last_run_day
+    today = today or date.today()
+    created = 0
+    while True:
+        batch_created = process_due_recurring_expenses(today=today, limit=batch_size)
+        if not batch_created:
+            break
+        created += batch_created
+    _last_run_day = today
+    return created
+
+
+def run_if_stale(today=None):
+    # Cheap enough for every request: the first call of each day starts the
+    # run on a thread of its own and returns at once, so no request waits on
+    # the backlog or on another request's run. Expenses added or resumed
+    # mid-day are charged by their routes.
+    today = today or date.today()
+    if _thread is not None or _last_run_day == today:
+        return None
+    if not _lock.acquire(blocking=False):
+        return None
+    if _last_run_day == today:
+        _lock.release()
+        return None
+    thread = threading.Thread(target=_run_once, args=(today,), name="mybank-scheduler-run", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_once(today):
+    try:
+        run_due(today)
+    except Exception as exc:
+        print(f"Recurring expense run failed: {exc}", file=sys.stderr)
+    finally:
+        close_db()
+        _lock.release()
+
+
+def _loop(interval):
+    while True:
+        try:
+            run_due()
+        except Exception as exc:
+            print(f"Recurring expense run failed: {exc}", file=sys.stderr)
+        finally:
+            close_db()
+        time.sleep(interval)
+
+
+def start_background(interval=SCHEDULER_INTERVAL):
+    global _thread
+    if interval <= 0 or _thread is not None:
+        return None
+    _thread = threading.Thread(target=_loop, args=(interval,), name="mybank-scheduler", daemon=True)
+    _thread.start()
+    return _thread
+
+
+if __name__ == "__main__":
+    init_db()
+    run_day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"Created {run_due(run_day)} recurring charges.")
@@ -0,0 +1,69 @@
+# Production entry point: the app under gunicorn with threaded workers.
+#
+#   python serve.py
+#
+# The defaults suit the 512MB / 1-CPU machine in fly.toml: a single worker
+# process keeps the one shared SQLite writer, the rate limiters and the
+# caches in one place, and its threads overlap requests waiting on the
+# database, the network or the password hashing pool.
+
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from app import app
+from storage import close_all, init_db
+
+PORT = int(os.environ.get("PORT", "8080"))
+WEB_WORKERS = int(os.environ.get("MYBANK_WEB_WORKERS", "1"))
+WEB_THREADS = int(os.environ.get("MYBANK_WEB_THREADS", "8"))
+WEB_KEEPALIVE = int(os.environ.get("MYBANK_WEB_KEEPALIVE", "5"))
+# Long enough for a large import or export; a stuck worker is replaced after it.
+WEB_TIMEOUT = int(os.environ.get("MYBANK_WEB_TIMEOUT", "120"))
+# Recycle workers now and then so slow leaks can't build up on a small VM.
+WEB_MAX_REQUESTS = int(os.environ.get("MYBANK_WEB_MAX_REQUESTS", "5000"))
+
+
+class Server(BaseApplication):
+    def __init__(self, wsgi_app, options):
+        self.wsgi_app = wsgi_app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.wsgi_app
+
+
+def options():
+    return {
+        "bind": f"0.0.0.0:{PORT}",
+        "workers": WEB_WORKERS,
+        "worker_class": "gthread",
+        "threads": WEB_THREADS,
+        "keepalive": WEB_KEEPALIVE,
+        "timeout": WEB_TIMEOUT,
+        "graceful_timeout": 30,
+        "max_requests": WEB_MAX_REQUESTS,
+        "max_requests_jitter": WEB_MAX_REQUESTS // 10,
+        # Worker heartbeats go to a tmpfs instead of the container's disk.
+        "worker_tmp_dir": "/dev/shm" if os.path.isdir("/dev/shm") else None,
+        "accesslog": "-",
+        "errorlog": "-",
+    }
+
+
+def main():
+    # Migrate once in the master, before any worker exists, and close every
+    # connection so none is inherited; workers open their own after the fork
+    # (see storage._reset_after_fork).
+    init_db()
+    close_all()
+    Server(app, options()).run()
+
+
+if __name__ == "__main__":
+    main()
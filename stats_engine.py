@@ -0,0 +1,164 @@
+import datetime
+import os
+
+from cache import LRUCache
+from money import to_dollars
+from storage import get_data_version, get_read_db, month_bounds
+
+STATS_CACHE_SIZE = int(os.environ.get("MYBANK_STATS_CACHE_SIZE", "256"))
+WINDOW_DAYS = (30, 90, 120, 360)
+VIEWS = ("totals", "windows", "monthly", "monthly_by_category")
+
+# user_id -> (data_version, day, stats). A write bumps the user's
+# data_version, so stale entries are simply never matched again.
+_cache = LRUCache(STATS_CACHE_SIZE)
+
+
+def load_stats(user_id, today=None):
+    today = today or datetime.date.today()
+    version = get_data_version(user_id)
+    cached = _cache.get(user_id)
+    if cached and cached[0] == version and cached[1] == today:
+        return cached[2]
+
+    stats = compute_stats(user_id, today)
+    _cache.set(user_id, (version, today, stats))
+    return stats
+
+
+def stats_views(user_id, views=VIEWS, today=None):
+    # The aggregate shapes served by /api/stats, built from the cached stats
+    # with amounts in dollars. Months are oldest first.
+    stats = load_stats(user_id, today)
+    result = {}
+    if "totals" in views:
+        result["totals"] = _dollars(stats["all_time"])
+    if "windows" in views:
+        result["windows"] = [
+            {"days": period["days"], **_dollars(period["totals"])} for period in stats["periods"]
+        ]
+    if "monthly" in views:
+        result["monthly"] = [
+            {
+                "month": item["month"],
+                "income": to_dollars(item["income"]),
+                "spending": to_dollars(item["spending"]),
+            }
+            for item in reversed(stats["months"])
+        ]
+    if "monthly_by_category" in views:
+        result["monthly_by_category"] = [
+            {
+                "month": month,
+                "type": tx_type,
+                "category": item["category"],
+                "total": to_dollars(item["total"]),
+            }
+            for month in sorted(stats["categories"])
+            for tx_type, items in stats["categories"][month].items()
+            for item in items
+        ]
+    return result
+
+
+def _window_bounds(today):
+    # Each rolling window is the partial month it starts in (summed from raw
+    # rows) plus every later month (summed from the rollups).
+    bounds = []
+    for days in WINDOW_DAYS:
+        start_date = (today - datetime.timedelta(days=days)).isoformat()
+        bounds.append((days, start_date, month_bounds(start_date[:7])[1]))
+    return bounds
+
+
+def compute_stats(user_id, today):
+    # Every amount in the result is integer cents.
+    windows = _window_bounds(today)
+    conn = get_read_db()
+
+    rollup_rows = conn.execute(
+        """
+        SELECT month, type, category, total_cents
+        FROM monthly_rollups
+        WHERE user_id = ?
+        ORDER BY month DESC, type ASC, total_cents DESC
+        """,
+        (user_id,),
+    ).fetchall()
+
+    partial_query = " UNION ALL ".join(
+        """
+        SELECT ? AS days, type, amount_cents
+        FROM transactions
+        WHERE user_id = ? AND date >= ? AND date < ?
+        """
+        for _ in windows
+    )
+    partial_params = []
+    for days, start_date, end_date in windows:
+        partial_params.extend([days, user_id, start_date, end_date])
+    partial_rows = conn.execute(
+        f"""
+        SELECT days, type, COALESCE(SUM(amount_cents), 0) AS total_cents
+        FROM ({partial_query})
+        GROUP BY days, type
+        """,
+        partial_params,
+    ).fetchall()
+
+    recent = conn.execute(
+        """
+        SELECT amount_cents, type, category, description, date
+        FROM transactions
+        WHERE user_id = ?
+        ORDER BY date DESC, id DESC
+        LIMIT 5
+        """,
+        (user_id,),
+    ).fetchall()
+
+    all_time = {"income": 0, "spending": 0}
+    window_totals = {days: {"income": 0, "spending": 0} for days in WINDOW_DAYS}
+    month_totals = {}
+    year_totals = {}
+    categories = {}
+    for row in rollup_rows:
+        month, tx_type, total = row["month"], row["type"], row["total_cents"]
+        year = month.split("-")[0]
+        all_time[tx_type] += total
+        for days, _, end_date in windows:
+            if month >= end_date[:7]:
+                window_totals[days][tx_type] += total
+        month_totals.setdefault(month, {"income": 0, "spending": 0})[tx_type] += total
+        year_totals.setdefault(year, {"income": 0, "spending": 0})[tx_type] += total
+        categories.setdefault(month, {"income": [], "spending": []})[tx_type].append(
+            {"category": row["category"], "total": total}
+        )
+    for row in partial_rows:
+        window_totals[row["days"]][row["type"]] += row["total_cents"]
+
+    months = []
+    for month, totals in month_totals.items():
+        months.append(
+            {
+                "month": month,
+                "year": month.split("-")[0],
+                "income": totals["income"],
+                "spending": totals["spending"],
+                "net": totals["income"] - totals["spending"],
+            }
+        )
+
+    return {
+        "all_time": all_time,
+        "periods": [{"days": days, "totals": window_totals[days]} for days in WINDOW_DAYS],
+        "recent": recent,
+        "months": months,
+        "month_totals": month_totals,
+        "year_totals": year_totals,
+        "categories": categories,
+    }
+
+
+def _dollars(totals):
+    return {tx_type: to_dollars(total) for tx_type, total in totals.items()}
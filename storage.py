@@ -1,12 +1,42 @@
+import base64
+import hashlib
+import json
 import os
+import re
+import secrets
 import sqlite3
-from calendar import monthrange
+import threading
+from contextlib import contextmanager
 from datetime import date
 
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import g, has_app_context
+import migrations
+from passwords import hash_password, needs_rehash, verify_password
+from cache import LRUCache
+from recurring import add_month, due_count, next_charge_date, occurrence
+from write_queue import WriteQueue
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.environ.get("MYBANK_DB_PATH", os.path.join(BASE_DIR, "mybank.db"))
+DB_POOL_SIZE = int(os.environ.get("MYBANK_DB_POOL_SIZE", "4"))
+COUNT_CACHE_SIZE = int(os.environ.get("MYBANK_COUNT_CACHE_SIZE", "1024"))
+EXPORT_BATCH_SIZE = int(os.environ.get("MYBANK_EXPORT_BATCH_SIZE", "1000"))
+# "1" sends transaction inserts, updates and deletes through a single writer
+# thread that commits them in batches of up to WRITE_BATCH_SIZE, waiting at
+# most WRITE_FLUSH_MS for a batch to fill.
+WRITE_QUEUE = os.environ.get("MYBANK_WRITE_QUEUE", "0") == "1"
+WRITE_BATCH_SIZE = int(os.environ.get("MYBANK_WRITE_BATCH_SIZE", "64"))
+WRITE_FLUSH_MS = float(os.environ.get("MYBANK_WRITE_FLUSH_MS", "1"))
+# Seconds a request waits for its queued write before giving up on it.
+WRITE_TIMEOUT = float(os.environ.get("MYBANK_WRITE_TIMEOUT", "30"))
+# "wal" enables write-ahead logging, the tuned pragmas below and read-only
+# reader connections next to a single shared writer.
+DB_MODE = os.environ.get("MYBANK_DB_MODE", "rollback").lower()
+DB_SYNCHRONOUS = os.environ.get("MYBANK_DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("MYBANK_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.environ.get("MYBANK_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_CACHE_SIZE = int(os.environ.get("MYBANK_DB_CACHE_SIZE", "-16000"))
+DB_TEMP_STORE = os.environ.get("MYBANK_DB_TEMP_STORE", "MEMORY")
 
 INCOME_CATEGORIES = ["work", "business", "financial_aid", "family", "investments", "sell", "other"]
 SPENDING_CATEGORIES = [
@@ -30,65 +60,177 @@ SPENDING_CATEGORIES = [
 ]
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def _connect(readonly=False, check_same_thread=True):
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=check_same_thread
+        )
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
+    if DB_MODE == "wal":
+        if not readonly:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA temp_store = {DB_TEMP_STORE}")
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, max_idle, readonly=False):
+        self.max_idle = max_idle
+        self.readonly = readonly
+        self._local = threading.local()
+
+    def _idle(self):
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def connect(self):
+        return _connect(readonly=self.readonly)
+
+    def acquire(self):
+        idle = self._idle()
+        if idle:
+            return idle.pop()
+        return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        idle = self._idle()
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def close_idle(self):
+        idle = self._idle()
+        while idle:
+            idle.pop().close()
+
+
+class SharedWriter:
+    # One connection for every mutation in the process. The lock is held for
+    # one transaction only, never for the rest of a request.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._conn = None
+
+    def connect(self):
+        return _connect(check_same_thread=False)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._conn is None:
+                self._conn = self.connect()
+            with self._conn:
+                yield self._conn
+
+    def close_idle(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _make_pools():
+    if DB_MODE == "wal":
+        return SharedWriter(), ConnectionPool(DB_POOL_SIZE, readonly=True)
+    return ConnectionPool(DB_POOL_SIZE), None
+
+
+def _reset_after_fork():
+    # A SQLite connection must not be used on both sides of a fork, and
+    # closing one in the child can drop the parent's file locks. The child
+    # keeps whatever it inherited referenced, so it is never finalized, and
+    # opens its own. Parents that fork on purpose call close_all() first.
+    global _pool, _read_pool, _cli_scope
+    _inherited.append((_pool, _read_pool, _cli_scope))
+    _pool, _read_pool = _make_pools()
+    _cli_scope = threading.local()
+
+
+_pool, _read_pool = _make_pools()
+_cli_scope = threading.local()
+_inherited = []
+os.register_at_fork(after_in_child=_reset_after_fork)
+_fts_available = None
+_count_cache = LRUCache(COUNT_CACHE_SIZE)
+_write_queue = None
+if WRITE_QUEUE:
+    _write_queue = WriteQueue(_connect, WRITE_BATCH_SIZE, WRITE_FLUSH_MS)
+
+
+def _scope():
+    # Inside a Flask request/app context the connections live on ``g`` and are
+    # released by ``close_db`` at teardown; CLI code keeps them per thread.
+    return g if has_app_context() else _cli_scope
+
+
+def _scoped(pool, name):
+    scope = _scope()
+    conn = getattr(scope, name, None)
+    if conn is None:
+        conn = pool.acquire()
+        setattr(scope, name, conn)
     return conn
 
 
+def get_db():
+    # Always used as ``with get_db() as conn:``; the block is one transaction.
+    # In WAL mode the shared writer is taken for that block alone.
+    if _read_pool is not None:
+        return _pool.transaction()
+    return _scoped(_pool, "db")
+
+
+def get_read_db():
+    if _read_pool is None:
+        return _scoped(_pool, "db")
+    return _scoped(_read_pool, "read_db")
+
+
+def close_db(exc=None):
+    scope = _scope()
+    conn = getattr(scope, "db", None)
+    if conn is not None:
+        scope.db = None
+        _pool.release(conn)
+    read_conn = getattr(scope, "read_db", None)
+    if read_conn is not None:
+        scope.read_db = None
+        _read_pool.release(read_conn)
+
+
+def close_all():
+    # Closes this thread's connections, e.g. in a server's master process
+    # before it forks workers.
+    close_db()
+    _pool.close_idle()
+    if _read_pool is not None:
+        _read_pool.close_idle()
+
+
 def init_db():
     with get_db() as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                type TEXT NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT NOT NULL,
-                date TEXT NOT NULL,
-                user_id INTEGER,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS recurring_expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT NOT NULL,
-                billing_day INTEGER NOT NULL,
-                start_date TEXT NOT NULL,
-                last_charged_date TEXT,
-                active INTEGER NOT NULL DEFAULT 1,
-                user_id INTEGER NOT NULL,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-            """
-        )
+        migrations.migrate(conn)
 
-        columns = conn.execute("PRAGMA table_info(transactions)").fetchall()
-        column_names = {col["name"] for col in columns}
-        if "user_id" not in column_names:
-            conn.execute("ALTER TABLE transactions ADD COLUMN user_id INTEGER")
+
+def rebuild_monthly_rollups(user_id=None):
+    with get_db() as conn:
+        migrations.rebuild_monthly_rollups(conn, user_id)
 
 
 def create_user(email, password):
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     with get_db() as conn:
         cursor = conn.execute(
             """
@@ -106,7 +248,7 @@ def create_user(email, password):
 
 
 def get_user_by_email(email):
-    with get_db() as conn:
+    with get_read_db() as conn:
         return conn.execute(
             "SELECT id, email, password_hash FROM users WHERE email = ?",
             (email.lower(),),
@@ -114,52 +256,183 @@ def get_user_by_email(email):
 
 
 def get_user_by_id(user_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         return conn.execute(
             "SELECT id, email FROM users WHERE id = ?",
             (user_id,),
         ).fetchone()
 
 
+def get_data_version(user_id):
+    with get_read_db() as conn:
+        row = conn.execute(
+            "SELECT data_version FROM users WHERE id = ?",
+            (user_id,),
+        ).fetchone()
+    return row["data_version"] if row else 0
+
+
 def authenticate_user(email, password):
     user = get_user_by_email(email)
     if not user:
         return None
-    if not check_password_hash(user["password_hash"], password):
+    if not verify_password(user["password_hash"], password):
         return None
+    if needs_rehash(user["password_hash"]):
+        password_hash = hash_password(password)
+        with get_db() as conn:
+            conn.execute(
+                "UPDATE users SET password_hash = ? WHERE id = ?",
+                (password_hash, user["id"]),
+            )
     return user
 
 
-def insert_transaction(user_id, amount, tx_type, category, description, date):
+def _api_token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_api_token(user_id, name):
+    # The token is returned once; only its hash is stored.
+    token = secrets.token_urlsafe(32)
     with get_db() as conn:
-        conn.execute(
+        cursor = conn.execute(
             """
-            INSERT INTO transactions (amount, type, category, description, date, user_id)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO api_tokens (user_id, token_hash, name, created_at)
+            VALUES (?, ?, ?, datetime('now'))
             """,
-            (amount, tx_type, category, description, date, user_id),
+            (user_id, _api_token_hash(token), name),
         )
+    return cursor.lastrowid, token
+
+
+def get_user_by_api_token(token):
+    with get_read_db() as conn:
+        return conn.execute(
+            """
+            SELECT users.id, users.email, api_tokens.id AS token_id
+            FROM api_tokens
+            JOIN users ON users.id = api_tokens.user_id
+            WHERE api_tokens.token_hash = ?
+            """,
+            (_api_token_hash(token),),
+        ).fetchone()
 
 
-def insert_recurring_expense(user_id, amount, category, description, billing_day, start_date, active=1):
+def list_api_tokens(user_id):
+    with get_read_db() as conn:
+        return conn.execute(
+            "SELECT id, name, created_at FROM api_tokens WHERE user_id = ? ORDER BY id",
+            (user_id,),
+        ).fetchall()
+
+
+def delete_api_token(token_id, user_id):
+    with get_db() as conn:
+        cursor = conn.execute(
+            "DELETE FROM api_tokens WHERE id = ? AND user_id = ?",
+            (token_id, user_id),
+        )
+    return cursor.rowcount > 0
+
+
+def _write(op, *args):
+    # Transaction writes run op(conn, *args) in a transaction of their own,
+    # or go through the group-commit queue when it is enabled.
+    if _write_queue is not None:
+        future = _write_queue.submit(op, *args)
+        try:
+            return future.result(timeout=WRITE_TIMEOUT)
+        except TimeoutError:
+            # Only a write the writer hasn't picked up yet can be withdrawn;
+            # one already in a batch may still commit.
+            future.cancel()
+            raise
+    with get_db() as conn:
+        return op(conn, *args)
+
+
+def _insert_transaction(conn, user_id, amount_cents, tx_type, category, description, date):
+    conn.execute(
+        """
+        INSERT INTO transactions (amount_cents, type, category, description, date, user_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (amount_cents, tx_type, category, description, date, user_id),
+    )
+
+
+def insert_transaction(user_id, amount_cents, tx_type, category, description, date):
+    _write(_insert_transaction, user_id, amount_cents, tx_type, category, description, date)
+
+
+def _insert_transactions(conn, user_id, transactions):
+    conn.executemany(
+        """
+        INSERT INTO transactions (amount_cents, type, category, description, date, user_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                tx["amount_cents"],
+                tx["type"],
+                tx["category"],
+                tx["description"],
+                tx["date"],
+                user_id,
+            )
+            for tx in transactions
+        ],
+    )
+    return len(transactions)
+
+
+def insert_transactions(user_id, transactions):
+    # Bulk path: every row goes in with one executemany and one commit.
+    return _write(_insert_transactions, user_id, transactions)
+
+
+def insert_recurring_expense(
+    user_id,
+    amount_cents,
+    category,
+    description,
+    billing_day,
+    start_date,
+    active=1,
+    frequency="monthly",
+):
     with get_db() as conn:
         cursor = conn.execute(
             """
             INSERT INTO recurring_expenses (
-                amount, category, description, billing_day, start_date, active, user_id, created_at
+                amount_cents, category, description, billing_day, frequency, start_date,
+                next_due_date, active, user_id, created_at
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
             """,
-            (amount, category, description, billing_day, start_date, int(active), user_id),
+            (
+                amount_cents,
+                category,
+                description,
+                billing_day,
+                frequency,
+                start_date,
+                _next_due_date(start_date, billing_day, frequency=frequency),
+                int(active),
+                user_id,
+            ),
         )
     return cursor.lastrowid
 
 
 def list_recurring_expenses(user_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         return conn.execute(
             """
-            SELECT id, amount, category, description, billing_day, start_date, last_charged_date, active
+            SELECT
+                id, amount_cents, category, description, billing_day, frequency, start_date,
+                last_charged_date, active
             FROM recurring_expenses
             WHERE user_id = ?
             ORDER BY active DESC, billing_day ASC, description ASC
@@ -169,10 +442,12 @@ def list_recurring_expenses(user_id):
 
 
 def fetch_recurring_expense(recurring_id, user_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         return conn.execute(
             """
-            SELECT id, amount, category, description, billing_day, start_date, last_charged_date, active
+            SELECT
+                id, amount_cents, category, description, billing_day, frequency, start_date,
+                last_charged_date, active
             FROM recurring_expenses
             WHERE id = ? AND user_id = ?
             """,
@@ -181,16 +456,42 @@ def fetch_recurring_expense(recurring_id, user_id):
 
 
 def update_recurring_expense(
-    recurring_id, user_id, amount, category, description, billing_day, start_date, active
+    recurring_id,
+    user_id,
+    amount_cents,
+    category,
+    description,
+    billing_day,
+    start_date,
+    active,
+    frequency="monthly",
 ):
     with get_db() as conn:
+        row = conn.execute(
+            "SELECT last_charged_date FROM recurring_expenses WHERE id = ? AND user_id = ?",
+            (recurring_id, user_id),
+        ).fetchone()
+        if not row:
+            return
         conn.execute(
             """
             UPDATE recurring_expenses
-            SET amount = ?, category = ?, description = ?, billing_day = ?, start_date = ?, active = ?
+            SET amount_cents = ?, category = ?, description = ?, billing_day = ?, frequency = ?,
+                start_date = ?, next_due_date = ?, active = ?
             WHERE id = ? AND user_id = ?
             """,
-            (amount, category, description, billing_day, start_date, int(active), recurring_id, user_id),
+            (
+                amount_cents,
+                category,
+                description,
+                billing_day,
+                frequency,
+                start_date,
+                _next_due_date(start_date, billing_day, row["last_charged_date"], frequency),
+                int(active),
+                recurring_id,
+                user_id,
+            ),
         )
 
 
@@ -214,87 +515,112 @@ def delete_recurring_expense(recurring_id, user_id):
         )
 
 
-def _add_month(dt):
-    if dt.month == 12:
-        return date(dt.year + 1, 1, 1)
-    return date(dt.year, dt.month + 1, 1)
+def month_bounds(month):
+    # "2026-03" -> ("2026-03-01", "2026-04-01"), a half-open range that lets
+    # SQLite use the (user_id, date) index instead of strftime() on every row.
+    try:
+        start = date.fromisoformat(f"{month}-01")
+    except ValueError:
+        return None
+    return start.isoformat(), add_month(start).isoformat()
 
 
-def _charge_date_for_month(year, month, billing_day):
-    last_day = monthrange(year, month)[1]
-    return date(year, month, min(billing_day, last_day))
+def _next_due_date(start_date, billing_day, last_charged_date=None, frequency="monthly"):
+    return next_charge_date(
+        date.fromisoformat(start_date),
+        billing_day,
+        date.fromisoformat(last_charged_date) if last_charged_date else None,
+        frequency,
+    ).isoformat()
 
 
-def process_due_recurring_expenses(user_id, today=None):
+def process_due_recurring_expenses(user_id=None, today=None, limit=None):
+    # Charges every active recurring expense whose next_due_date has passed,
+    # for one user or (user_id=None) for everyone, at most ``limit`` rows.
     today = today or date.today()
     if isinstance(today, str):
         today = date.fromisoformat(today)
 
+    clauses = ["active = 1", "next_due_date <= ?"]
+    params = [today.isoformat()]
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    where = " AND ".join(clauses)
+    limit_clause = f"LIMIT {int(limit)}" if limit else ""
+
+    # Check on a reader first so callers with nothing due never take the writer.
+    if not get_read_db().execute(
+        f"SELECT 1 FROM recurring_expenses WHERE {where} LIMIT 1", params
+    ).fetchone():
+        return 0
+
     with get_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
         rows = conn.execute(
-            """
-            SELECT id, amount, category, description, billing_day, start_date, last_charged_date
+            f"""
+            SELECT
+                id, user_id, amount_cents, category, description, billing_day, frequency,
+                next_due_date
             FROM recurring_expenses
-            WHERE user_id = ? AND active = 1 AND start_date <= ?
-            ORDER BY id ASC
+            WHERE {where}
+            ORDER BY next_due_date ASC, id ASC
+            {limit_clause}
             """,
-            (user_id, today.isoformat()),
+            params,
         ).fetchall()
 
-        created = 0
+        # The missing charges of each row are computed directly from its
+        # next_due_date, then the whole batch is written in two statements.
+        charges = []
+        schedule_updates = []
         for row in rows:
-            start_date = date.fromisoformat(row["start_date"])
-            last_charged_date = (
-                date.fromisoformat(row["last_charged_date"]) if row["last_charged_date"] else None
-            )
-            cursor_month = date(start_date.year, start_date.month, 1)
-            latest_charge_date = last_charged_date
-
-            while cursor_month <= today:
-                charge_date = _charge_date_for_month(
-                    cursor_month.year, cursor_month.month, row["billing_day"]
+            next_due_date = date.fromisoformat(row["next_due_date"])
+            count = due_count(next_due_date, row["billing_day"], row["frequency"], today)
+            if not count:
+                continue
+            charges.extend(
+                (
+                    row["amount_cents"],
+                    row["category"],
+                    row["description"],
+                    occurrence(next_due_date, row["billing_day"], row["frequency"], index).isoformat(),
+                    row["user_id"],
                 )
-                should_charge = charge_date >= start_date and charge_date <= today
-                if last_charged_date:
-                    should_charge = should_charge and charge_date > last_charged_date
-
-                if should_charge:
-                    conn.execute(
-                        """
-                        INSERT INTO transactions (amount, type, category, description, date, user_id)
-                        VALUES (?, 'spending', ?, ?, ?, ?)
-                        """,
-                        (
-                            row["amount"],
-                            row["category"],
-                            row["description"],
-                            charge_date.isoformat(),
-                            user_id,
-                        ),
-                    )
-                    created += 1
-                    latest_charge_date = charge_date
-
-                cursor_month = _add_month(cursor_month)
-
-            if latest_charge_date and latest_charge_date != last_charged_date:
-                conn.execute(
-                    """
-                    UPDATE recurring_expenses
-                    SET last_charged_date = ?
-                    WHERE id = ? AND user_id = ?
-                    """,
-                    (latest_charge_date.isoformat(), row["id"], user_id),
+                for index in range(count)
+            )
+            schedule_updates.append(
+                (
+                    occurrence(next_due_date, row["billing_day"], row["frequency"], count - 1).isoformat(),
+                    occurrence(next_due_date, row["billing_day"], row["frequency"], count).isoformat(),
+                    row["id"],
                 )
+            )
+
+        conn.executemany(
+            """
+            INSERT INTO transactions (amount_cents, type, category, description, date, user_id)
+            VALUES (?, 'spending', ?, ?, ?, ?)
+            """,
+            charges,
+        )
+        conn.executemany(
+            """
+            UPDATE recurring_expenses
+            SET last_charged_date = ?, next_due_date = ?
+            WHERE id = ?
+            """,
+            schedule_updates,
+        )
 
-    return created
+    return len(charges)
 
 
 def fetch_transaction(tx_id, user_id):
-    with get_db() as conn:
+    with get_read_db() as conn:
         return conn.execute(
             """
-            SELECT id, amount, type, category, description, date
+            SELECT id, amount_cents, type, category, description, date
             FROM transactions
             WHERE id = ? AND user_id = ?
             """,
@@ -302,78 +628,274 @@ def fetch_transaction(tx_id, user_id):
         ).fetchone()
 
 
-def update_transaction(tx_id, user_id, amount, tx_type, category, description, date):
-    with get_db() as conn:
-        conn.execute(
-            """
-            UPDATE transactions
-            SET amount = ?, type = ?, category = ?, description = ?, date = ?
-            WHERE id = ? AND user_id = ?
-            """,
-            (amount, tx_type, category, description, date, tx_id, user_id),
-        )
+def _update_transaction(conn, tx_id, user_id, amount_cents, tx_type, category, description, date):
+    conn.execute(
+        """
+        UPDATE transactions
+        SET amount_cents = ?, type = ?, category = ?, description = ?, date = ?
+        WHERE id = ? AND user_id = ?
+        """,
+        (amount_cents, tx_type, category, description, date, tx_id, user_id),
+    )
+
+
+def update_transaction(tx_id, user_id, amount_cents, tx_type, category, description, date):
+    _write(_update_transaction, tx_id, user_id, amount_cents, tx_type, category, description, date)
+
+
+def _delete_transaction(conn, tx_id, user_id):
+    conn.execute(
+        "DELETE FROM transactions WHERE id = ? AND user_id = ?",
+        (tx_id, user_id),
+    )
 
 
 def delete_transaction(tx_id, user_id):
-    with get_db() as conn:
-        conn.execute(
-            "DELETE FROM transactions WHERE id = ? AND user_id = ?",
-            (tx_id, user_id),
-        )
+    _write(_delete_transaction, tx_id, user_id)
 
 
-def count_transactions(user_id, search_query=None, category=None, tx_type=None):
-    clauses = []
-    params = []
-    clauses.append("user_id = ?")
-    params.append(user_id)
-    if search_query:
-        clauses.append("(description LIKE ? OR category LIKE ? OR type LIKE ? OR date LIKE ?)")
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        row = get_read_db().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'"
+        ).fetchone()
+        _fts_available = row is not None
+    return _fts_available
+
+
+def _fts_match_query(user_id, search_query):
+    # Each whitespace-separated term becomes a prefix phrase over its word
+    # tokens, so "eating_out" matches "eating out*" and "2026-03" matches
+    # dates in March 2026. Terms are ANDed and scoped to the user.
+    phrases = []
+    for term in search_query.split():
+        tokens = re.findall(r"\w+", term)
+        if tokens:
+            phrases.append(f'{{description category type date}} : "{" ".join(tokens)}"*')
+    if not phrases:
+        return None
+    return f'user_id : "{int(user_id)}" AND ' + " AND ".join(phrases)
+
+
+def _transaction_filters(user_id, search_query=None, category=None, tx_type=None):
+    source = "transactions AS t"
+    clauses = ["t.user_id = ?"]
+    params = [user_id]
+    match_query = None
+    if search_query and fts_available():
+        match_query = _fts_match_query(user_id, search_query)
+    if match_query:
+        # CROSS JOIN pins the FTS index as the outer loop; otherwise SQLite
+        # walks every row of the user and probes the index once per row.
+        source = "transactions_fts CROSS JOIN transactions AS t ON t.id = transactions_fts.rowid"
+        clauses.append("transactions_fts MATCH ?")
+        params.append(match_query)
+    elif search_query:
+        clauses.append("(t.description LIKE ? OR t.category LIKE ? OR t.type LIKE ? OR t.date LIKE ?)")
         token = f"%{search_query}%"
         params.extend([token, token, token, token])
     if category:
-        clauses.append("category = ?")
+        clauses.append("t.category = ?")
         params.append(category)
     if tx_type:
-        clauses.append("type = ?")
+        clauses.append("t.type = ?")
         params.append(tx_type)
+    return source, clauses, params
 
-    clause = f"WHERE {' AND '.join(clauses)}" if clauses else ""
 
-    with get_db() as conn:
-        row = conn.execute(
-            f"SELECT COUNT(*) AS total FROM transactions {clause}",
-            params,
-        ).fetchone()
-    return row["total"] if row else 0
+def encode_cursor(row):
+    raw = json.dumps([row["date"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
 
-def query_transactions(user_id, search_query=None, category=None, tx_type=None, limit=20, offset=0):
-    clauses = []
-    params = []
-    clauses.append("user_id = ?")
-    params.append(user_id)
-    if search_query:
-        clauses.append("(description LIKE ? OR category LIKE ? OR type LIKE ? OR date LIKE ?)")
-        token = f"%{search_query}%"
-        params.extend([token, token, token, token])
-    if category:
-        clauses.append("category = ?")
-        params.append(category)
-    if tx_type:
-        clauses.append("type = ?")
-        params.append(tx_type)
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        tx_date, tx_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(tx_date, str) or not isinstance(tx_id, int):
+        return None
+    return tx_date, tx_id
+
 
-    clause = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+def next_cursor(rows, limit):
+    # Pages come back in (date DESC, id DESC) order, so the last row of a full
+    # page is where the next one starts.
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1])
+
+
+def _transactions_query(
+    user_id,
+    search_query=None,
+    category=None,
+    tx_type=None,
+    limit=20,
+    offset=0,
+    cursor=None,
+    rank=False,
+    until=None,
+    mode="page",
+):
+    # mode is "page" for a page of rows, "page_with_total" to also return the
+    # size of the whole filtered set on every row, or "count" for just that.
+    # cursor and until bound a keyset range: rows strictly after cursor, down
+    # to and including until.
+    source, clauses, params = _transaction_filters(user_id, search_query, category, tx_type)
+    if mode == "count":
+        return f"SELECT COUNT(*) AS total FROM {source} WHERE {' AND '.join(clauses)}", params
+
+    order_by = "t.date DESC, t.id DESC"
+    if rank and "transactions_fts" in source:
+        order_by = f"bm25(transactions_fts), {order_by}"
+    else:
+        if cursor:
+            clauses.append("(t.date, t.id) < (?, ?)")
+            params.extend(cursor)
+            offset = 0
+        if until:
+            clauses.append("(t.date, t.id) >= (?, ?)")
+            params.extend(until)
+
+    total_column = ", COUNT(*) OVER () AS total" if mode == "page_with_total" else ""
     params.extend([limit, offset])
-    with get_db() as conn:
-        return conn.execute(
+    sql = f"""
+        SELECT t.id, t.amount_cents, t.type, t.category, t.description, t.date{total_column}
+        FROM {source}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {order_by}
+        LIMIT ? OFFSET ?
+    """
+    return sql, params
+
+
+def iter_transactions(user_id, batch_size=EXPORT_BATCH_SIZE):
+    # Yields every transaction of the user oldest first, batch_size rows at a
+    # time. Each batch is its own keyset query, so no read lock is held while
+    # the caller is busy with the rows already handed out.
+    conn = get_read_db()
+    after = None
+    while True:
+        clause = "AND (date, id) > (?, ?)" if after else ""
+        params = [user_id, *(after or ()), batch_size]
+        cursor = conn.execute(
             f"""
-            SELECT id, amount, type, category, description, date
+            SELECT id, amount_cents, type, category, description, date
             FROM transactions
-            {clause}
-            ORDER BY date DESC, id DESC
-            LIMIT ? OFFSET ?
+            WHERE user_id = ? {clause}
+            ORDER BY date ASC, id ASC
+            LIMIT ?
             """,
             params,
-        ).fetchall()
+        )
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["date"], rows[-1]["id"])
+
+
+def transaction_changes(user_id, since=0, limit=1000):
+    # Rows and tombstones changed after the ``since`` watermark, oldest change
+    # first. The returned watermark is the version the caller has caught up
+    # to; has_more says another call is needed to reach the current one.
+    current = get_data_version(user_id)
+    reset = since > current
+    if reset:
+        since = 0
+    conn = get_read_db()
+    params = (user_id, since, current, limit)
+    rows = conn.execute(
+        """
+        SELECT id, amount_cents, type, category, description, date, updated_at, version
+        FROM transactions
+        WHERE user_id = ? AND version > ? AND version <= ?
+        ORDER BY version
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    deleted = conn.execute(
+        """
+        SELECT id, version
+        FROM transaction_tombstones
+        WHERE user_id = ? AND version > ? AND version <= ?
+        ORDER BY version
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+
+    watermark = current
+    full = [items for items in (rows, deleted) if len(items) == limit]
+    if full:
+        # Stop at the last version that every truncated list fully covers.
+        watermark = min(items[-1]["version"] for items in full)
+        rows = [row for row in rows if row["version"] <= watermark]
+        deleted = [row for row in deleted if row["version"] <= watermark]
+    return {
+        "changes": rows,
+        "deleted": [row["id"] for row in deleted],
+        "watermark": watermark,
+        "has_more": watermark < current,
+        "reset": reset,
+    }
+
+
+def _rollup_count(conn, user_id, category=None, tx_type=None):
+    clauses = ["user_id = ?"]
+    params = [user_id]
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    if tx_type:
+        clauses.append("type = ?")
+        params.append(tx_type)
+    row = conn.execute(
+        f"SELECT COALESCE(SUM(tx_count), 0) AS total FROM monthly_rollups WHERE {' AND '.join(clauses)}",
+        params,
+    ).fetchone()
+    return row["total"]
+
+
+def search_transactions(
+    user_id,
+    search_query=None,
+    category=None,
+    tx_type=None,
+    limit=20,
+    offset=0,
+    cursor=None,
+    rank=False,
+    until=None,
+):
+    # Returns (rows, total). Totals are cached per user and filter until the
+    # user's data_version moves, so paging only counts the set once.
+    filters = (user_id, search_query, category, tx_type)
+    version = get_data_version(user_id)
+    cached = _count_cache.get(filters)
+    total = cached[1] if cached and cached[0] == version else None
+
+    with get_read_db() as conn:
+        if total is None and not search_query:
+            # Without a text search the monthly rollups already hold the count.
+            total = _rollup_count(conn, user_id, category, tx_type)
+            _count_cache.set(filters, (version, total))
+
+        # The window count only sees the whole set when no cursor narrows it.
+        mode = "page_with_total" if total is None and not (cursor or until) else "page"
+        sql, params = _transactions_query(*filters, limit, offset, cursor, rank, until, mode)
+        rows = conn.execute(sql, params).fetchall()
+        if total is None:
+            if rows and mode == "page_with_total":
+                total = rows[0]["total"]
+            else:
+                sql, params = _transactions_query(*filters, mode="count")
+                total = conn.execute(sql, params).fetchone()["total"]
+            _count_cache.set(filters, (version, total))
+    return rows, total
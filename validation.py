@@ -0,0 +1,75 @@
+import datetime
+
+from money import to_cents
+from storage import INCOME_CATEGORIES, SPENDING_CATEGORIES
+
+
+def valid_category(tx_type, category):
+    if tx_type == "income":
+        return category in INCOME_CATEGORIES
+    if tx_type == "spending":
+        return category in SPENDING_CATEGORIES
+    return False
+
+
+def parse_amount(raw):
+    # Integer cents, or None when raw isn't a number.
+    return to_cents(raw)
+
+
+def parse_date(raw):
+    # Strictly YYYY-MM-DD, returned in that canonical form. fromisoformat
+    # would also take "20260101" or "2026-W05-3", which break every query
+    # that slices or orders dates as text.
+    try:
+        return datetime.datetime.strptime(str(raw).strip(), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return None
+
+
+def _field(form, key, message, types=(str,)):
+    # JSON callers can send any type; a wrong one is that item's error, not
+    # an AttributeError further down.
+    value = form.get(key)
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise ValueError(message)
+    return value
+
+
+def normalize_transaction(form):
+    try:
+        amount = _field(form, "amount", "Amount must be a positive number.", (str, int, float))
+        tx_type = _field(form, "type", "Type must be income or spending.").lower()
+        category = _field(form, "category", "Please pick a valid category.").lower()
+        description = _field(form, "description", "Description must be text.")
+        date = _field(form, "date", "Date must be a valid date.")
+    except ValueError as exc:
+        return None, str(exc)
+    amount_cents = parse_amount(amount)
+    date = date or datetime.date.today().isoformat()
+
+    if amount_cents is None or amount_cents <= 0:
+        return None, "Amount must be a positive number."
+
+    if tx_type not in ("income", "spending"):
+        return None, "Type must be income or spending."
+
+    if not valid_category(tx_type, category):
+        return None, "Please pick a valid category."
+
+    date = parse_date(date)
+    if date is None:
+        return None, "Date must be a valid date."
+
+    if not description.strip():
+        description = "(no description)"
+
+    return {
+        "amount_cents": amount_cents,
+        "type": tx_type,
+        "category": category,
+        "description": description,
+        "date": date,
+    }, None
@@ -0,0 +1,188 @@
+# Group commit: request threads hand their writes to one writer thread, which
+# applies whatever has queued up in a single SQLite transaction and resolves
+# each caller's future once that transaction has committed. Enabled in
+# storage with MYBANK_WRITE_QUEUE=1.
+#
+#   python -m write_queue [writers] [writes]   benchmark against one commit per row
+
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    def __init__(self, connect, batch_size=64, flush_ms=1.0):
+        self.connect = connect
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_ms / 1000
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_batch = 1
+        # The writer thread doesn't survive a fork; a forked process starts
+        # its own, with an empty queue, on its first write.
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, op, *args):
+        # op(conn, *args) runs on the writer's connection inside a savepoint,
+        # so one failing write doesn't take the rest of its batch with it.
+        future = Future()
+        with self._lock:
+            self._ensure_writer()
+            self._queue.put((future, op, args))
+        return future
+
+    def _ensure_writer(self):
+        # Called with the lock held. A writer that died on an error is
+        # replaced by a new one with a fresh connection.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="mybank-writer", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        # Only linger for more writes when the last batch had company; a lone
+        # writer shouldn't pay the flush delay on every commit.
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + (self.flush_seconds if self._last_batch > 1 else 0)
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        self._last_batch = len(batch)
+        return [item for item in batch if item[0].set_running_or_notify_cancel()]
+
+    def _run(self):
+        conn = None
+        batch = []
+        try:
+            conn = self.connect()
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    self._commit(conn, batch)
+        except Exception as exc:
+            self._fail(batch, exc)
+            if conn is not None:
+                conn.close()
+
+    def _fail(self, batch, exc):
+        # The writer is going away: every write it took or that is still
+        # queued fails with its error instead of waiting forever. Under the
+        # lock, so a write submitted from now on starts a new writer.
+        with self._lock:
+            self._thread = None
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0].set_running_or_notify_cancel():
+                    batch.append(item)
+        for future, _, _ in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _commit(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, op, args in batch:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    outcomes.append((future, op(conn, *args), None))
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO queued_write")
+                    outcomes.append((future, None, exc))
+                conn.execute("RELEASE queued_write")
+            conn.commit()
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.rollback()
+            for future, _, _ in batch:
+                future.set_exception(exc)
+            return
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+def _measure(write, writers, writes):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        timings = []
+        for number in range(writes):
+            start = time.perf_counter()
+            write(index, number)
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (
+        len(latencies) / elapsed,
+        latencies[len(latencies) // 2],
+        latencies[int(len(latencies) * 0.99)],
+        latencies[-1],
+    )
+
+
+def benchmark(writers, writes):
+    # Always on a scratch database, never the one MYBANK_DB_PATH points at.
+    os.environ["MYBANK_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    import storage
+
+    storage.init_db()
+    user_id = storage.create_user("benchmark@example.com", "benchmark")
+    storage.close_db()
+
+    def row(index, number):
+        return (user_id, 1234, "spending", "groceries", f"writer {index} #{number}", "2026-01-01")
+
+    def one_commit_per_row(index, number):
+        with storage.get_db() as conn:
+            storage._insert_transaction(conn, *row(index, number))
+        storage.close_db()
+
+    write_queue = WriteQueue(storage._connect, storage.WRITE_BATCH_SIZE, storage.WRITE_FLUSH_MS)
+
+    def group_commit(index, number):
+        write_queue.submit(storage._insert_transaction, *row(index, number)).result()
+
+    print(
+        f"{writers} writer threads x {writes} inserts, {storage.DB_MODE} mode, "
+        f"batches of up to {write_queue.batch_size}, flush after {storage.WRITE_FLUSH_MS} ms"
+    )
+    for label, write in (("one commit per row", one_commit_per_row), ("group commit", group_commit)):
+        per_second, p50, p99, slowest = _measure(write, writers, writes)
+        print(
+            f"{label:<20} {per_second:10,.0f} writes/s   p50 {p50 * 1000:7.2f} ms"
+            f"   p99 {p99 * 1000:7.2f} ms   max {slowest * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 16,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+    )